@@ -2,13 +2,30 @@ import logging
 import asyncio
 import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
+from telegram.error import RetryAfter
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
 import csv
 import io
 import threading
+import sys
+import mmap
+import struct
+import random
+import time
+import heapq
+import math
+import gzip
+import shutil
+import tempfile
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 
 # Flask HTTP সার্ভার for UptimeRobot
 from flask import Flask, jsonify
@@ -51,21 +68,624 @@ def run_flask():
 
 # ডাটা সংরক্ষণের ফাইল
 DATA_FILE = "stock_signals.json"
+SNAPSHOT_FILE = "stock_signals.rrbs"
+# ডাটা ফাইলের সংরক্ষিত কী: {user_id: পরের সিগন্যাল id}, যাতে মুছে ফেলা id আর ফিরে না আসে
+NEXT_IDS_KEY = "_next_ids"
+# 'json' অথবা 'binary' (mmap করা স্ন্যাপশট)
+DATA_FORMAT = os.environ.get('DATA_FORMAT', 'json')
+
+def data_file_path():
+    """DATA_FORMAT অনুযায়ী ডাটা ফাইলের পাথ"""
+    return SNAPSHOT_FILE if DATA_FORMAT == 'binary' else DATA_FILE
+
+def load_data(path=None):
+    """ডাটা ফাইল থেকে সব ইউজারের ডাটা লোড করা"""
+    path = path or data_file_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        if DATA_FORMAT == 'binary':
+            with SignalSnapshot(path) as snap:
+                return snap.to_dict()
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ ডাটা ফাইল পড়া যায়নি ({path}): {e}")
+        return {}
+
+def save_data(data, path=None):
+    """ডাটা সংরক্ষণ করা (DATA_FORMAT অনুযায়ী JSON বা বাইনারি স্ন্যাপশট)"""
+    path = path or data_file_path()
+    if DATA_FORMAT == 'binary':
+        save_snapshot(data, path)
+        return
+    # কম্প্যাক্ট JSON - indent ছাড়া লেখা ও পার্স দুটোই দ্রুত
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    # অ্যাটমিক রিপ্লেস - লেখার মাঝে ক্র্যাশ হলে আগের ফাইল অক্ষত থাকে
+    os.replace(tmp_path, path)
+
+# ---------------------------------------------------------------------------
+# বাইনারি স্ন্যাপশট ফরম্যাট
+#
+# লেআউট (সব little-endian):
+#   হেডার    : magic, ভার্সন, ইউজার/সিগন্যাল/সিম্বল সংখ্যা, সেকশন অফসেট
+#   সিম্বল টেবিল: প্রতিটি সিম্বল একবার (u16 দৈর্ঘ্য + UTF-8 বাইট)
+#   ইনডেক্স  : user_id অনুযায়ী সাজানো (i64 user_id, u32 start, u32 count)
+#              v3 থেকে সাথে u32 next_id (সিগন্যাল না থাকলেও ইউজার থাকে)
+#   কলাম     : symbol_id(u32), capital/risk/buy/sl/tp(f64), timestamp(i64 µs)
+#   v2 কলাম  : closed_at(i64 µs), signal id(u32), status(u8)
+#
+# একজন ইউজারের সিগন্যাল প্রতিটি কলামে পাশাপাশি থাকে, তাই mmap করে
+# ইনডেক্সে বাইনারি সার্চ করলেই শুধু তার অংশটুকু পড়া যায় (user_signals)।
+# চলমান বট মেমরির SignalStore থেকে পড়ে; রিড-অনলি CLI টুল (load_user_signals)
+# পুরো স্টোর লোড না করে এই পথে একজন ইউজারের ডাটা পড়ে।
+# ---------------------------------------------------------------------------
+SNAPSHOT_MAGIC = b'RRBS'
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct('<4sHHIIIQQQ')
+SNAPSHOT_INDEX_ENTRY = struct.Struct('<qIII')
+SNAPSHOT_INDEX_ENTRY_V2 = struct.Struct('<qII')
+SNAPSHOT_FLOAT_COLUMNS = ('capital', 'risk', 'buy', 'sl', 'tp')
+SNAPSHOT_NO_TIMESTAMP = -(1 << 63)
+# স্ট্যাটাস কোড = এই টাপলের ইনডেক্স (শুধু শেষে নতুন স্ট্যাটাস যোগ করুন)
+SIGNAL_STATUSES = ('open', 'closed', 'sl_hit', 'tp_hit')
+_EPOCH = datetime(1970, 1, 1)
+
+def _align8(n):
+    return (n + 7) & ~7
+
+def _timestamp_to_us(value):
+    """ISO টাইমস্ট্যাম্প থেকে epoch মাইক্রোসেকেন্ড"""
+    if not value:
+        return SNAPSHOT_NO_TIMESTAMP
+    return (datetime.fromisoformat(value) - _EPOCH) // timedelta(microseconds=1)
+
+def _us_to_timestamp(value):
+    """epoch মাইক্রোসেকেন্ড থেকে ISO টাইমস্ট্যাম্প"""
+    if value == SNAPSHOT_NO_TIMESTAMP:
+        return None
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+def _column_bytes(typecode, values):
+    col = array(typecode, values)
+    if sys.byteorder != 'little':
+        col.byteswap()
+    return col.tobytes()
+
+def save_snapshot(data, path):
+    """{user_id: [signal, ...]} ডাটা বাইনারি স্ন্যাপশটে লেখা"""
+    next_ids = data.get(NEXT_IDS_KEY, {})
+    user_ids = {uid for uid, signals in data.items() if uid != NEXT_IDS_KEY and signals} | set(next_ids)
+    users = sorted((int(uid), data.get(uid, []), next_ids.get(uid, 0)) for uid in user_ids)
+
+    symbol_ids = {}
+    symbol_col = []
+    float_cols = {name: [] for name in SNAPSHOT_FLOAT_COLUMNS}
+    ts_col = []
+    closed_col = []
+    id_col = []
+    status_col = []
+    index = bytearray()
+
+    for uid, signals, next_id in users:
+        index += SNAPSHOT_INDEX_ENTRY.pack(uid, len(symbol_col), len(signals), next_id)
+        for item in signals:
+            symbol_col.append(symbol_ids.setdefault(item['symbol'], len(symbol_ids)))
+            for name in SNAPSHOT_FLOAT_COLUMNS:
+                float_cols[name].append(float(item[name]))
+            ts_col.append(_timestamp_to_us(item.get('timestamp')))
+            closed_col.append(_timestamp_to_us(item.get('closed_at')))
+            id_col.append(item.get('id', 0))
+            status_col.append(SIGNAL_STATUSES.index(item.get('status', 'open')))
+
+    symtab = bytearray()
+    for sym in symbol_ids:
+        encoded = sym.encode('utf-8')
+        symtab += struct.pack('<H', len(encoded)) + encoded
+
+    n_signals = len(symbol_col)
+    symtab_off = SNAPSHOT_HEADER.size
+    index_off = _align8(symtab_off + len(symtab))
+    columns_off = _align8(index_off + len(index))
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0,
+        len(users), n_signals, len(symbol_ids),
+        symtab_off, index_off, columns_off
+    )
 
-def load_data():
-    """JSON ফাইল থেকে ডাটা লোড করা"""
-    if os.path.exists(DATA_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(symtab)
+        f.write(b'\0' * (index_off - symtab_off - len(symtab)))
+        f.write(index)
+        f.write(b'\0' * (columns_off - index_off - len(index)))
+        symbol_bytes = _column_bytes('I', symbol_col)
+        f.write(symbol_bytes)
+        f.write(b'\0' * (_align8(len(symbol_bytes)) - len(symbol_bytes)))
+        for name in SNAPSHOT_FLOAT_COLUMNS:
+            f.write(_column_bytes('d', float_cols[name]))
+        f.write(_column_bytes('q', ts_col))
+        f.write(_column_bytes('q', closed_col))
+        id_bytes = _column_bytes('I', id_col)
+        f.write(id_bytes)
+        f.write(b'\0' * (_align8(len(id_bytes)) - len(id_bytes)))
+        f.write(bytes(status_col))
+    # অ্যাটমিক রিপ্লেস - পুরনো mmap রিডাররা আগের ফাইলই দেখবে
+    os.replace(tmp_path, path)
+
+class SignalSnapshot:
+    """mmap দিয়ে বাইনারি স্ন্যাপশট পড়া"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
         try:
-            with open(DATA_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"খালি স্ন্যাপশট ফাইল: {path}")
+
+        (magic, version, _, self.n_users, self.n_signals, n_symbols,
+         symtab_off, self._index_off, columns_off) = SNAPSHOT_HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"স্ন্যাপশট ফাইল নয়: {path}")
+        if version not in (1, 2, SNAPSHOT_VERSION):
+            self.close()
+            raise ValueError(f"অসমর্থিত স্ন্যাপশট ভার্সন: {version}")
+
+        self._index_struct = SNAPSHOT_INDEX_ENTRY if version >= 3 else SNAPSHOT_INDEX_ENTRY_V2
+
+        # সিম্বল টেবিল ছোট, তাই একবারেই পড়ে রাখা
+        self.symbols = []
+        off = symtab_off
+        for _ in range(n_symbols):
+            (length,) = struct.unpack_from('<H', self._mm, off)
+            off += 2
+            self.symbols.append(self._mm[off:off + length].decode('utf-8'))
+            off += length
+
+        self._symbol_off = columns_off
+        col_off = columns_off + _align8(4 * self.n_signals)
+        self._float_offs = {}
+        for name in SNAPSHOT_FLOAT_COLUMNS:
+            self._float_offs[name] = col_off
+            col_off += 8 * self.n_signals
+        self._ts_off = col_off
+        # v1 ফাইলে id/status কলাম নেই
+        self._has_ids = version >= 2
+        if self._has_ids:
+            self._closed_off = self._ts_off + 8 * self.n_signals
+            self._id_off = self._closed_off + 8 * self.n_signals
+            self._status_off = self._id_off + _align8(4 * self.n_signals)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _index_entry(self, i):
+        """(user_id, start, count, next_id) - v3 এর আগে next_id 0"""
+        entry = self._index_struct.unpack_from(self._mm, self._index_off + i * self._index_struct.size)
+        return entry if len(entry) == 4 else entry + (0,)
+
+    def _find_user(self, uid):
+        """ইনডেক্সে বাইনারি সার্চ - (start, count) অথবা None"""
+        lo, hi = 0, self.n_users
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key, start, count, _ = self._index_entry(mid)
+            if key == uid:
+                return start, count
+            if key < uid:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
 
-def save_data(data):
-    """JSON ফাইলে ডাটা সংরক্ষণ করা"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    def _read_range(self, start, count):
+        symbol_ids = struct.unpack_from(f'<{count}I', self._mm, self._symbol_off + 4 * start)
+        cols = {
+            name: struct.unpack_from(f'<{count}d', self._mm, off + 8 * start)
+            for name, off in self._float_offs.items()
+        }
+        timestamps = struct.unpack_from(f'<{count}q', self._mm, self._ts_off + 8 * start)
+        if self._has_ids:
+            closed = struct.unpack_from(f'<{count}q', self._mm, self._closed_off + 8 * start)
+            ids = struct.unpack_from(f'<{count}I', self._mm, self._id_off + 4 * start)
+            statuses = self._mm[self._status_off + start:self._status_off + start + count]
+
+        signals = []
+        for i in range(count):
+            item = {'symbol': self.symbols[symbol_ids[i]]}
+            for name in SNAPSHOT_FLOAT_COLUMNS:
+                item[name] = cols[name][i]
+            ts = _us_to_timestamp(timestamps[i])
+            if ts is not None:
+                item['timestamp'] = ts
+            if self._has_ids:
+                if ids[i]:
+                    item['id'] = ids[i]
+                if statuses[i]:
+                    item['status'] = SIGNAL_STATUSES[statuses[i]]
+                closed_at = _us_to_timestamp(closed[i])
+                if closed_at is not None:
+                    item['closed_at'] = closed_at
+            signals.append(item)
+        return signals
+
+    def user_signals(self, user_id):
+        """একজন ইউজারের সিগন্যাল - অন্য কারো ডাটা ডিসিরিয়ালাইজ না করে"""
+        try:
+            found = self._find_user(int(user_id))
+        except ValueError:
+            return []
+        if found is None:
+            return []
+        return self._read_range(*found)
+
+    def iter_users(self):
+        """(user_id, signals) - একবারে একজন ইউজার"""
+        for i in range(self.n_users):
+            uid, start, count, _ = self._index_entry(i)
+            if count:
+                yield str(uid), self._read_range(start, count)
+
+    def next_ids(self):
+        """{user_id: পরের সিগন্যাল id}"""
+        next_ids = {}
+        for i in range(self.n_users):
+            uid, _, _, next_id = self._index_entry(i)
+            if next_id:
+                next_ids[str(uid)] = next_id
+        return next_ids
+
+    def to_dict(self):
+        """পুরো স্ন্যাপশট {user_id: [signal, ...]} আকারে"""
+        data = dict(self.iter_users())
+        next_ids = self.next_ids()
+        if next_ids:
+            data[NEXT_IDS_KEY] = next_ids
+        return data
+
+def json_to_snapshot(json_path, snapshot_path):
+    """পুরনো JSON ফাইল থেকে বাইনারি স্ন্যাপশট তৈরি"""
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    save_snapshot(data, snapshot_path)
+    return data
+
+def snapshot_to_json(snapshot_path, json_path):
+    """বাইনারি স্ন্যাপশট থেকে JSON ফাইল তৈরি"""
+    with SignalSnapshot(snapshot_path) as snap:
+        data = snap.to_dict()
+    with open(json_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    return data
+
+# ---------------------------------------------------------------------------
+# ইন-মেমরি সিগন্যাল স্টোর
+#
+# প্রতিটি সিগন্যালের ইউজার-ভিত্তিক স্থায়ী id থাকে। এডিট/ক্লোজ/ডিলিট
+# সরাসরি {user_id: {signal_id: item}} ডিকশনারিতে O(1) এ হয় এবং জার্নাল
+# ফাইলে এক লাইন যোগ হয়। ডাটা ফাইল হলো জার্নালের বেস (চেকপয়েন্ট)।
+# জার্নাল বেসের চেয়ে বড় হলে চেকপয়েন্ট হয়: জার্নাল <journal>.1 এ সরিয়ে
+# নতুন জার্নাল শুরু হয় আর পুরো ডাটা ব্যাকগ্রাউন্ড থ্রেডে save_data() দিয়ে
+# লেখা হয়। লেখা শেষ হলে .1 মুছে যায়; তার আগে ক্র্যাশ হলে load() বেসের
+# উপর .1 ও জার্নাল দুটোই রিপ্লে করে। প্রতি রাইটে গড় খরচ তাই O(1)।
+#
+# লিসেনাররা (পরিসংখ্যান, পোর্টফোলিও ইত্যাদি) on_add/on_remove পায়, তাই
+# তারা পুরো ডাটা আবার না গুনে ইনক্রিমেন্টালি আপডেট হয়।
+# ---------------------------------------------------------------------------
+JOURNAL_FILE = "stock_signals.journal"
+# জার্নাল এর চেয়ে ছোট থাকলে চেকপয়েন্ট হয় না (ছোট স্টোরে বারবার পুরো ফাইল লেখা এড়াতে)
+JOURNAL_MIN_CHECKPOINT_BYTES = 1 << 20
+
+def journal_paths(journal_path):
+    """রিপ্লের ক্রমে জার্নাল ফাইল - অসমাপ্ত চেকপয়েন্টের সরানো জার্নাল আগে"""
+    return [journal_path + '.1', journal_path]
+
+def iter_journal(journal_path):
+    """রিপ্লের ক্রমে সব জার্নাল এন্ট্রি"""
+    for path in journal_paths(journal_path):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # ক্র্যাশের সময় অর্ধেক লেখা শেষ লাইন
+                    logger.warning("⚠️ জার্নালের একটি লাইন বাদ দেওয়া হলো")
+                    break
+                yield entry
+
+def apply_journal_entry(entry, put, delete, delete_user):
+    """একটি জার্নাল এন্ট্রি কলব্যাকে পাঠানো: put(user_id, item), delete(user_id, signal_id), delete_user(user_id)"""
+    op = entry['op']
+    if op == 'put':
+        put(entry['user'], entry['item'])
+    elif op == 'delete':
+        delete(entry['user'], entry['id'])
+    elif op == 'delete_user':
+        delete_user(entry['user'])
+
+def replay_journal(journal_path, put, delete, delete_user):
+    """সব জার্নাল এন্ট্রি (আইডেমপোটেন্ট) ক্রমানুসারে প্রয়োগ করা"""
+    for entry in iter_journal(journal_path):
+        try:
+            apply_journal_entry(entry, put, delete, delete_user)
+        except KeyError:
+            logger.warning("⚠️ জার্নালের একটি লাইন বাদ দেওয়া হলো")
+            break
+
+def assign_signal_id(next_ids, user_id, item):
+    """id না থাকলে ইউজারের পরের id দেওয়া ও next_ids হাই-ওয়াটার মার্ক বাড়ানো"""
+    if 'id' not in item:
+        item['id'] = next_ids.get(user_id, 1)
+    next_ids[user_id] = max(next_ids.get(user_id, 1), item['id'] + 1)
+    return item['id']
+
+STATUS_LABELS = {'open': 'ওপেন', 'closed': 'ক্লোজড', 'sl_hit': 'SL হিট', 'tp_hit': 'TP হিট'}
+
+def is_open(item):
+    """সিগন্যাল এখনো ওপেন কিনা"""
+    return item.get('status', 'open') == 'open'
+
+def close_result_text(signal_store, user_id, signal_id, result):
+    """store.close() এর ফলাফল থেকে ইউজারের জন্য মেসেজ"""
+    if result is None:
+        return f"❌ #{signal_id} সিগন্যাল পাওয়া যায়নি।"
+    if result is False:
+        status = signal_store.get(user_id, signal_id).get('status', 'open')
+        return f"ℹ️ #{signal_id} সিগন্যাল আগেই বন্ধ ({STATUS_LABELS.get(status, status)})।"
+    return f"✅ #{signal_id} সিগন্যাল ক্লোজ করা হয়েছে।"
+
+class SignalStore:
+    """id ভিত্তিক সিগন্যাল স্টোর"""
+
+    def __init__(self, journal_path=JOURNAL_FILE, data_path=None, min_checkpoint_bytes=JOURNAL_MIN_CHECKPOINT_BYTES):
+        self.journal_path = journal_path
+        self.data_path = data_path
+        self.min_checkpoint_bytes = min_checkpoint_bytes
+        self._users = {}
+        self._next_id = {}
+        self._listeners = []
+        self._journal = None
+        self._journal_bytes = 0
+        self._base_bytes = 0
+        self._checkpoint = None
+        self._executor = None
+        self._batch_depth = 0
+
+    def subscribe(self, listener):
+        """লিসেনার যোগ করা - বিদ্যমান সিগন্যালগুলো on_add দিয়ে রিপ্লে হয়"""
+        self._listeners.append(listener)
+        for user_id, signals in self._users.items():
+            for item in signals.values():
+                listener.on_add(user_id, item)
+
+    def _notify_add(self, user_id, item):
+        for listener in self._listeners:
+            listener.on_add(user_id, item)
+
+    def _notify_remove(self, user_id, item):
+        for listener in self._listeners:
+            listener.on_remove(user_id, item)
+
+    # --- লোড ও পারসিস্টেন্স ---
+
+    def load(self, readonly=False):
+        """ডাটা ফাইল ও জার্নাল থেকে স্টোর লোড করা
+
+        readonly=True হলে জার্নাল শুধু পড়া হয় - লেখার জন্য খোলা বা কম্প্যাক্ট করা হয় না
+        (চলমান বটের পাশাপাশি CLI টুলের জন্য)।
+        """
+        migrated = False
+        data = load_data(self.data_path)
+        # id হাই-ওয়াটার মার্ক - জার্নালের put এন্ট্রি এটাকে শুধু বাড়ায়, ডিলিট কমায় না
+        self._next_id.update((user_id, int(next_id)) for user_id, next_id in data.pop(NEXT_IDS_KEY, {}).items())
+        for user_id, signals in data.items():
+            for item in signals:
+                migrated = migrated or 'id' not in item
+                self._put(user_id, dict(item))
+
+        rotated, _ = journal_paths(self.journal_path)
+        replay_journal(self.journal_path, self._put, self._pop, self._pop_user)
+
+        if readonly:
+            return
+        self._journal = open(self.journal_path, 'a')
+        self._journal_bytes = self._journal.tell()
+        self._base_bytes = self._data_bytes()
+        if migrated or os.path.exists(rotated):
+            # পুরনো id-বিহীন সিগন্যালের id স্থায়ীভাবে লেখা / অসমাপ্ত চেকপয়েন্ট শেষ করা
+            self.compact()
+
+    def _put(self, user_id, item):
+        """id সহ সিগন্যাল বসানো (id না থাকলে নতুন id দেওয়া)"""
+        signals = self._users.setdefault(user_id, {})
+        assign_signal_id(self._next_id, user_id, item)
+
+        old = signals.get(item['id'])
+        if old is not None:
+            self._notify_remove(user_id, old)
+        signals[item['id']] = item
+        self._notify_add(user_id, item)
+        return item
+
+    def _pop(self, user_id, signal_id):
+        signals = self._users.get(user_id)
+        if not signals or signal_id not in signals:
+            return None
+        item = signals.pop(signal_id)
+        if not signals:
+            del self._users[user_id]
+        self._notify_remove(user_id, item)
+        return item
+
+    def _pop_user(self, user_id):
+        signal_ids = list(self._users.get(user_id, {}))
+        for signal_id in signal_ids:
+            self._pop(user_id, signal_id)
+        return len(signal_ids)
+
+    def _apply(self, entry):
+        """একটি জার্নাল এন্ট্রি প্রয়োগ করা (আইডেমপোটেন্ট)"""
+        apply_journal_entry(entry, self._put, self._pop, self._pop_user)
+
+    def _log(self, entry):
+        if self._journal is None:
+            return
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        self._journal.write(line)
+        self._journal_bytes += len(line)
+        if not self._batch_depth:
+            self._journal.flush()
+            self._maybe_checkpoint()
+
+    def _maybe_checkpoint(self):
+        if self._journal_bytes > max(self._base_bytes, self.min_checkpoint_bytes):
+            self.compact(wait=False)
+
+    @contextmanager
+    def batch(self, checkpoint=True):
+        """ভেতরের সব রাইটের জার্নাল একবারে flush; checkpoint=False হলে চেকপয়েন্ট পরে maybe_checkpoint() এ"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._journal is not None:
+                self._journal.flush()
+                if checkpoint:
+                    self._maybe_checkpoint()
+
+    def maybe_checkpoint(self):
+        """জার্নাল বড় হয়ে গেলে ব্যাকগ্রাউন্ড চেকপয়েন্ট শুরু করা"""
+        if self._journal is not None and not self._batch_depth:
+            self._maybe_checkpoint()
+
+    def _data_bytes(self):
+        path = self.data_path or data_file_path()
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def compact(self, wait=True):
+        """চেকপয়েন্ট লিখে জার্নাল নতুন করে শুরু করা (load() এর আগে কিছু করে না)
+
+        wait=False হলে ফাইল লেখা ব্যাকগ্রাউন্ড থ্রেডে হয়; আগের চেকপয়েন্ট চলতে থাকলে কিছু করে না।
+        """
+        if self._journal is None:
+            return
+        if self._checkpoint is not None:
+            if not wait and not self._checkpoint.done():
+                return
+            self._checkpoint.result()
+            self._checkpoint = None
+
+        # আইটেম কখনো জায়গায় বদলানো হয় না, তাই লিস্টের শ্যালো কপিই স্থির স্ন্যাপশট
+        data = self.to_dict()
+        rotated, _ = journal_paths(self.journal_path)
+        self._journal.close()
+        if os.path.exists(rotated):
+            # আগের চেকপয়েন্ট ব্যর্থ হয়েছিল - পুরনো এন্ট্রির পরে জুড়ে দেওয়া
+            with open(rotated, 'a') as dst, open(self.journal_path, 'r') as src:
+                dst.write(src.read())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, rotated)
+        self._journal = open(self.journal_path, 'a')
+        self._journal_bytes = 0
+
+        if wait:
+            self._write_checkpoint(data, rotated)
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            self._checkpoint = self._executor.submit(self._write_checkpoint, data, rotated)
+
+    def _write_checkpoint(self, data, rotated):
+        try:
+            save_data(data, self.data_path)
+        except Exception as e:
+            # .1 জার্নাল থেকে যায়, পরের চেকপয়েন্ট/লোড সেটা রিপ্লে করবে
+            logger.error(f"❌ চেকপয়েন্ট লেখা যায়নি: {e}")
+            return
+        os.remove(rotated)
+        self._base_bytes = self._data_bytes()
+
+    def to_dict(self):
+        """{user_id: [signal, ...]} আকারে পুরো ডাটা, সাথে NEXT_IDS_KEY এ id হাই-ওয়াটার মার্ক"""
+        data = {user_id: list(signals.values()) for user_id, signals in self._users.items()}
+        data[NEXT_IDS_KEY] = dict(self._next_id)
+        return data
+
+    # --- রিড ---
+
+    def user_signals(self, user_id):
+        """ইউজারের সিগন্যাল লিস্ট (যোগ করার ক্রমে)"""
+        return list(self._users.get(user_id, {}).values())
+
+    def get(self, user_id, signal_id):
+        return self._users.get(user_id, {}).get(signal_id)
+
+    def users(self):
+        """(user_id, signals) জোড়া - signals হলো {signal_id: item}"""
+        return self._users.items()
+
+    # --- রাইট ---
+
+    def add(self, user_id, item):
+        """নতুন সিগন্যাল যোগ - id সহ আইটেম ফেরত দেয়"""
+        item = self._put(user_id, dict(item))
+        self._log({'op': 'put', 'user': user_id, 'item': item})
+        return item
+
+    def update(self, user_id, signal_id, **fields):
+        """একটি সিগন্যালের ফিল্ড পরিবর্তন - না পেলে None"""
+        old = self.get(user_id, signal_id)
+        if old is None:
+            return None
+        item = {**old, **fields, 'id': signal_id}
+        self._put(user_id, item)
+        self._log({'op': 'put', 'user': user_id, 'item': item})
+        return item
+
+    def close(self, user_id, signal_id, status='closed'):
+        """ওপেন সিগন্যাল ক্লোজ করা - ক্লোজ হওয়া আইটেম, না পেলে None, আগেই ক্লোজড হলে False
+
+        আগে থেকে ক্লোজড সিগন্যালের স্ট্যাটাস (যেমন মনিটরের tp_hit) ও সময় বদলানো হয় না।
+        """
+        item = self.get(user_id, signal_id)
+        if item is None:
+            return None
+        if not is_open(item):
+            return False
+        return self.update(user_id, signal_id, status=status, closed_at=datetime.now().isoformat())
+
+    def delete(self, user_id, signal_id):
+        """একটি সিগন্যাল মুছে ফেলা - মুছে ফেলা আইটেম অথবা None"""
+        item = self._pop(user_id, signal_id)
+        if item is not None:
+            self._log({'op': 'delete', 'user': user_id, 'id': signal_id})
+        return item
+
+    def delete_user(self, user_id):
+        """ইউজারের সব সিগন্যাল মুছে ফেলা - কয়টি মুছল"""
+        count = self._pop_user(user_id)
+        if count:
+            self._log({'op': 'delete_user', 'user': user_id})
+        return count
 
 def parse_data_format(text):
     """ডাটা ফরম্যাট পার্স করা: aaa 500000 0.01 30 29 39"""
@@ -216,6 +836,7 @@ def create_table_view(data_list):
     table += "=" * 120 + "\n"
 
     for i, item in enumerate(data_list, 1):
+        i = item.get('id', i)
         rrr = calculate_rrr(item)
         diff = calculate_diff(item)
         position = calculate_position(item)
@@ -240,6 +861,7 @@ def create_compact_table(data_list):
     table += "=" * 70 + "\n"
 
     for i, item in enumerate(data_list, 1):
+        i = item.get('id', i)
         rrr = calculate_rrr(item)
         diff = calculate_diff(item)
         profit_percent = calculate_profit_percentage(item)
@@ -250,55 +872,1290 @@ def create_compact_table(data_list):
 
     return table
 
-def get_statistics(data_list):
-    """পরিসংখ্যান বের করা"""
-    if not data_list:
-        return None
+class UserStatsIndex:
+    """ইউজারভিত্তিক পরিসংখ্যান - on_add/on_remove এ ইনক্রিমেন্টাল আপডেট"""
 
-    total_signals = len(data_list)
-    total_capital = sum(item['capital'] for item in data_list)
-    total_risk = sum(item['capital'] * item['risk'] for item in data_list)
-    avg_rrr = sum(calculate_rrr(item) for item in data_list) / total_signals
-    avg_profit_percent = sum(calculate_profit_percentage(item) for item in data_list) / total_signals
+    def __init__(self):
+        self._users = {}
+
+    def on_add(self, user_id, item):
+        self._apply(user_id, item, 1)
+
+    def on_remove(self, user_id, item):
+        self._apply(user_id, item, -1)
+
+    def _apply(self, user_id, item, sign):
+        agg = self._users.setdefault(user_id, {
+            'total_signals': 0, 'total_capital': 0, 'total_risk': 0,
+            'sum_rrr': 0, 'sum_profit_percent': 0, 'symbols': {}
+        })
+        profit_percent = calculate_profit_percentage(item)
+        agg['total_signals'] += sign
+        agg['total_capital'] += sign * item['capital']
+        agg['total_risk'] += sign * item['capital'] * item['risk']
+        agg['sum_rrr'] += sign * calculate_rrr(item)
+        agg['sum_profit_percent'] += sign * profit_percent
 
-    # সিম্বল অনুযায়ী গ্রুপিং
-    symbols = {}
-    for item in data_list:
         sym = item['symbol']
+        symbols = agg['symbols']
         if sym not in symbols:
             symbols[sym] = {'count': 0, 'total_capital': 0, 'total_profit_percent': 0}
-        symbols[sym]['count'] += 1
-        symbols[sym]['total_capital'] += item['capital']
-        symbols[sym]['total_profit_percent'] += calculate_profit_percentage(item)
+        symbols[sym]['count'] += sign
+        symbols[sym]['total_capital'] += sign * item['capital']
+        symbols[sym]['total_profit_percent'] += sign * profit_percent
+        if symbols[sym]['count'] == 0:
+            del symbols[sym]
+
+        if agg['total_signals'] == 0:
+            del self._users[user_id]
+
+    def stats(self, user_id):
+        """{total_signals, total_capital, total_risk, avg_rrr, avg_profit_percent, symbols}, না থাকলে None"""
+        agg = self._users.get(user_id)
+        if agg is None:
+            return None
+        n = agg['total_signals']
+        return {
+            'total_signals': n,
+            'total_capital': agg['total_capital'],
+            'total_risk': agg['total_risk'],
+            'avg_rrr': agg['sum_rrr'] / n,
+            'avg_profit_percent': agg['sum_profit_percent'] / n,
+            'symbols': agg['symbols']
+        }
+
+# ---------------------------------------------------------------------------
+# প্রাইস মনিটর
+#
+# প্রতিটি সিম্বলের ওপেন সিগন্যালগুলো SL ও TP অনুযায়ী সাজানো দুটি লিস্টে
+# থাকে। একটি টিক এলে bisect দিয়ে শুধু যেগুলো ক্রস হয়েছে সেগুলো পাওয়া
+# যায় - O(log n + k), সব ইউজার স্ক্যান না করে।
+# ---------------------------------------------------------------------------
+# 'csv:/path/ticks.csv' অথবা 'tcp:host:port', খালি থাকলে মনিটর বন্ধ
+PRICE_FEED = os.environ.get('PRICE_FEED', '')
+
+class LevelIndex:
+    """প্রাইস লেভেল অনুযায়ী সাজানো (level, ref) লিস্ট"""
+
+    __slots__ = ('levels', 'refs')
+
+    def __init__(self):
+        self.levels = []
+        self.refs = []
+
+    def __len__(self):
+        return len(self.levels)
+
+    def insert(self, level, ref):
+        i = bisect_right(self.levels, level)
+        self.levels.insert(i, level)
+        self.refs.insert(i, ref)
+
+    def remove(self, level, ref):
+        i = bisect_left(self.levels, level)
+        while i < len(self.levels) and self.levels[i] == level:
+            if self.refs[i] == ref:
+                del self.levels[i]
+                del self.refs[i]
+                return True
+            i += 1
+        return False
+
+    def at_or_above(self, price):
+        """level >= price এমন সব ref"""
+        return self.refs[bisect_left(self.levels, price):]
+
+    def at_or_below(self, price):
+        """level <= price এমন সব ref"""
+        return self.refs[:bisect_right(self.levels, price)]
+
+class PriceMonitor:
+    """ওপেন সিগন্যালের SL/TP ইনডেক্স - স্টোর লিসেনার"""
+
+    def __init__(self):
+        self._sl = {}
+        self._tp = {}
+
+    def on_add(self, user_id, item):
+        if not is_open(item):
+            return
+        ref = (user_id, item['id'])
+        self._sl.setdefault(item['symbol'], LevelIndex()).insert(item['sl'], ref)
+        self._tp.setdefault(item['symbol'], LevelIndex()).insert(item['tp'], ref)
+
+    def on_remove(self, user_id, item):
+        if not is_open(item):
+            return
+        ref = (user_id, item['id'])
+        sym = item['symbol']
+        for indexes, level in ((self._sl, item['sl']), (self._tp, item['tp'])):
+            index = indexes.get(sym)
+            if index is not None:
+                index.remove(level, ref)
+                if not index:
+                    del indexes[sym]
+
+    def open_count(self):
+        return sum(len(index) for index in self._sl.values())
+
+    def process_tick(self, symbol, price):
+        """একটি টিকে যেসব সিগন্যালের SL/TP হিট হয়েছে: [(user_id, signal_id, status)]"""
+        hits = []
+        sl_index = self._sl.get(symbol)
+        if sl_index is not None:
+            hits.extend((user_id, signal_id, 'sl_hit') for user_id, signal_id in sl_index.at_or_above(price))
+        tp_index = self._tp.get(symbol)
+        if tp_index is not None:
+            hit_refs = {(user_id, signal_id) for user_id, signal_id, _ in hits}
+            hits.extend(
+                (user_id, signal_id, 'tp_hit')
+                for user_id, signal_id in tp_index.at_or_below(price)
+                if (user_id, signal_id) not in hit_refs
+            )
+        return hits
+
+def apply_tick(signal_store, monitor, symbol, price):
+    """টিক প্রসেস করে হিট হওয়া সিগন্যাল স্টোরে ক্লোজ করা - ক্লোজ হওয়া [(user_id, item)]
+
+    একটি টিকের সব ক্লোজ জার্নালে একবারে flush হয়; চেকপয়েন্ট এখানে হয় না (কলার maybe_checkpoint() ডাকে)।
+    """
+    hits = monitor.process_tick(symbol, price)
+    if not hits:
+        return []
+    closed = []
+    with signal_store.batch(checkpoint=False):
+        for user_id, signal_id, status in hits:
+            item = signal_store.close(user_id, signal_id, status=status)
+            if item:
+                closed.append((user_id, item))
+    return closed
+
+async def csv_tick_source(path, interval=0.0):
+    """CSV (symbol,price) ফাইল থেকে টিক রিপ্লে"""
+    with open(path, newline='') as f:
+        for n, row in enumerate(csv.reader(f)):
+            if len(row) < 2:
+                continue
+            try:
+                price = float(row[1])
+            except ValueError:
+                # হেডার লাইন
+                continue
+            yield row[0].strip().upper(), price
+            if interval:
+                await asyncio.sleep(interval)
+            elif n % 1000 == 0:
+                await asyncio.sleep(0)
+
+async def socket_tick_source(host, port):
+    """TCP সকেট থেকে 'SYMBOL PRICE' লাইন পড়া"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            parts = line.decode('utf-8', 'replace').replace(',', ' ').split()
+            if len(parts) < 2:
+                continue
+            try:
+                yield parts[0].upper(), float(parts[1])
+            except ValueError:
+                continue
+    finally:
+        writer.close()
+
+def make_tick_source(spec):
+    """PRICE_FEED স্পেক থেকে টিক সোর্স তৈরি - ভুল স্পেকে ValueError"""
+    kind, _, target = spec.partition(':')
+    if kind == 'csv':
+        if not target:
+            raise ValueError(f"CSV ফাইলের পাথ নেই: {spec}")
+        return csv_tick_source(target)
+    if kind == 'tcp':
+        host, _, port = target.rpartition(':')
+        if not host or not port.isdigit() or not 0 < int(port) < 65536:
+            raise ValueError(f"tcp:host:port ফরম্যাট ঠিক নেই: {spec}")
+        return socket_tick_source(host, int(port))
+    raise ValueError(f"অজানা প্রাইস ফিড: {spec}")
+
+def format_hit_message(item):
+    """SL/TP হিট নোটিফিকেশন টেক্সট"""
+    pl = calculate_profit_loss(item)
+    if item['status'] == 'tp_hit':
+        return f"🎯 #{item['id']} {item['symbol']} TP ({item['tp']:.1f}) হিট করেছে!\n💰 প্রফিট: {pl['profit']:,} BDT"
+    return f"🛑 #{item['id']} {item['symbol']} SL ({item['sl']:.1f}) হিট করেছে!\n📉 লস: {pl['loss']:,} BDT"
+
+async def run_price_monitor(bot, source):
+    """টিক সোর্স থেকে পড়ে হিট হলে ইউজারকে জানানো"""
+    logger.info(f"📡 প্রাইস মনিটর চালু ({price_monitor.open_count()} ওপেন সিগন্যাল)")
+    try:
+        async for symbol, price in source:
+            closed = apply_tick(store, price_monitor, symbol, price)
+            if not closed:
+                continue
+            # ফাইল লেখা ব্যাকগ্রাউন্ড থ্রেডে - ইভেন্ট লুপ আটকায় না
+            store.maybe_checkpoint()
+            for user_id, item in closed:
+                try:
+                    await bot.send_message(chat_id=user_id, text=format_hit_message(item))
+                except Exception as e:
+                    logger.warning(f"⚠️ নোটিফিকেশন পাঠানো যায়নি ({user_id}): {e}")
+    except Exception as e:
+        logger.error(f"❌ প্রাইস ফিড বন্ধ হয়ে গেছে: {e}")
+
+def benchmark_price_monitor(n_signals=100_000, n_ticks=10_000, n_symbols=300, seed=1):
+    """n_signals ওপেন সিগন্যাল ও n_ticks টিকে মনিটরের থ্রুপুট মাপা
+
+    বটের মতোই আসল পথ: অস্থায়ী ফোল্ডারে load() করা স্টোর (জার্নাল ও চেকপয়েন্ট সহ),
+    সব লিসেনার, আর run_price_monitor এর মতো apply_tick + maybe_checkpoint।
+    """
+    rng = random.Random(seed)
+    bench_dir = tempfile.mkdtemp(prefix='rrbench-')
+    try:
+        return _benchmark_price_monitor(bench_dir, rng, n_signals, n_ticks, n_symbols)
+    finally:
+        shutil.rmtree(bench_dir, ignore_errors=True)
+
+def _benchmark_price_monitor(bench_dir, rng, n_signals, n_ticks, n_symbols):
+    bench_store = SignalStore(
+        journal_path=os.path.join(bench_dir, 'bench.journal'),
+        data_path=os.path.join(bench_dir, 'bench.data')
+    )
+    bench_store.load()
+    monitor = PriceMonitor()
+    for listener in (UserStatsIndex(), monitor, PortfolioIndex(), SymbolIndex()):
+        bench_store.subscribe(listener)
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    prices = {sym: rng.uniform(10, 500) for sym in symbols}
+
+    started = time.perf_counter()
+    for n in range(n_signals):
+        sym = rng.choice(symbols)
+        buy = prices[sym] * rng.uniform(0.98, 1.02)
+        bench_store.add(str(n % 5000), {
+            'symbol': sym, 'capital': 100000.0, 'risk': 0.01,
+            'buy': buy, 'sl': buy * rng.uniform(0.85, 0.99), 'tp': buy * rng.uniform(1.01, 1.3)
+        })
+    load_seconds = time.perf_counter() - started
+
+    ticks = []
+    for _ in range(n_ticks):
+        sym = rng.choice(symbols)
+        prices[sym] *= rng.uniform(0.995, 1.005)
+        ticks.append((sym, prices[sym]))
+
+    started = time.perf_counter()
+    hits = 0
+    for sym, price in ticks:
+        closed = apply_tick(bench_store, monitor, sym, price)
+        if closed:
+            bench_store.maybe_checkpoint()
+            hits += len(closed)
+    tick_seconds = time.perf_counter() - started
+    bench_store.compact()
 
     return {
-        'total_signals': total_signals,
-        'total_capital': total_capital,
-        'total_risk': total_risk,
-        'avg_rrr': avg_rrr,
-        'avg_profit_percent': avg_profit_percent,
-        'symbols': symbols
+        'signals': n_signals,
+        'ticks': n_ticks,
+        'hits': hits,
+        'index_seconds': load_seconds,
+        'tick_seconds': tick_seconds,
+        'ticks_per_second': n_ticks / tick_seconds if tick_seconds else float('inf')
     }
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """/start কমান্ড হ্যান্ডলার"""
-    user = update.effective_user
+# ---------------------------------------------------------------------------
+# ব্যাকটেস্ট
+#
+# OHLC_DIR/<SYMBOL>.csv ফাইলে date(বা datetime/time), high, low, close কলাম
+# থাকতে হবে। প্রতিটি সিগন্যাল তার টাইমস্ট্যাম্পের পর প্রথম যে বারে দাম buy
+# ছোঁয় (low <= buy <= high) সেখানে এন্ট্রি ধরা হয়, কখনো না ছুঁলে not_filled।
+# এন্ট্রি বার থেকে SL/TP খোঁজা হয়; একই বারে দুটোই ছুঁলে SL আগে ধরা হয়।
+# প্রতিটি সিম্বল আলাদা প্রসেসে চলে।
+# ---------------------------------------------------------------------------
+OHLC_DIR = os.environ.get('OHLC_DIR', 'ohlc')
+PROCESS_WORKERS = int(os.environ.get('PROCESS_WORKERS', os.cpu_count() or 2))
+OHLC_TIME_COLUMNS = ('date', 'datetime', 'time', 'timestamp')
+
+_process_pool = None
+
+def get_process_pool():
+    """ভারী ক্যালকুলেশনের জন্য শেয়ার্ড প্রসেস পুল"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+    return _process_pool
+
+def load_ohlc(path):
+    """OHLC CSV থেকে সময় অনুযায়ী সাজানো (times, high, low, close) অ্যারে
+
+    পার্স করা অ্যারে <path>.npz এ ক্যাশ থাকে, CSV বদলালে আবার পার্স হয়।
+    """
+    cache_path = path + '.npz'
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        with np.load(cache_path) as cached:
+            return cached['times'], cached['high'], cached['low'], cached['close']
+
+    times, high, low, close = parse_ohlc_csv(path)
+    # একই সিম্বলের সমান্তরাল ব্যাকটেস্ট যেন অর্ধেক লেখা ক্যাশ না পড়ে - আলাদা tmp থেকে অ্যাটমিক রিপ্লেস
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, times=times, high=high, low=low, close=close)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"⚠️ OHLC ক্যাশ লেখা যায়নি ({cache_path}): {e}")
+    return times, high, low, close
+
+def parse_ohlc_csv(path):
+    """OHLC CSV পার্স করা"""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = [h.strip().lower() for h in next(reader, [])]
+        # StopIteration প্রসেস পুলের future এ যেতে পারে না, তাই ValueError
+        time_col = next((i for i, h in enumerate(header) if h in OHLC_TIME_COLUMNS), None)
+        if time_col is None:
+            raise ValueError(f"{path}: সময়ের কলাম নেই ({', '.join(OHLC_TIME_COLUMNS)})")
+        missing = [name for name in ('high', 'low', 'close') if name not in header]
+        if missing:
+            raise ValueError(f"{path}: কলাম নেই: {', '.join(missing)}")
+        high_col, low_col, close_col = (header.index(name) for name in ('high', 'low', 'close'))
+        rows = [row for row in reader if row]
+
+    times = np.array([row[time_col].strip().replace(' ', 'T') for row in rows], dtype='datetime64[s]')
+    high = np.array([row[high_col] for row in rows], dtype=np.float64)
+    low = np.array([row[low_col] for row in rows], dtype=np.float64)
+    close = np.array([row[close_col] for row in rows], dtype=np.float64)
+
+    order = np.argsort(times, kind='stable')
+    return times[order], high[order], low[order], close[order]
+
+def backtest_symbol(path, signals):
+    """একটি সিম্বলের সিগন্যালগুলো OHLC বারের উপর চালানো (প্রসেস পুলে চলে)"""
+    times, high, low, close = load_ohlc(path)
+    n_bars = len(times)
+
+    entry_times = np.array(
+        [(item.get('timestamp') or '1970-01-01')[:19] for item in signals],
+        dtype='datetime64[s]'
+    )
+    starts = np.searchsorted(times, entry_times, side='left')
+
+    results = []
+    for item, start in zip(signals, starts):
+        result = {'id': item.get('id'), 'symbol': item['symbol'], 'position': calculate_position(item)}
+        if start >= n_bars:
+            result.update(outcome='no_data')
+            results.append(result)
+            continue
+
+        fills = np.flatnonzero((low[start:] <= item['buy']) & (high[start:] >= item['buy']))
+        if not len(fills):
+            result.update(outcome='not_filled')
+            results.append(result)
+            continue
+        start += int(fills[0])
+
+        sl_hits = np.flatnonzero(low[start:] <= item['sl'])
+        tp_hits = np.flatnonzero(high[start:] >= item['tp'])
+        sl_at = sl_hits[0] if len(sl_hits) else n_bars
+        tp_at = tp_hits[0] if len(tp_hits) else n_bars
+
+        if sl_at == n_bars and tp_at == n_bars:
+            outcome, exit_at, exit_price = 'open', n_bars - 1 - start, float(close[-1])
+        elif sl_at <= tp_at:
+            outcome, exit_at, exit_price = 'sl', int(sl_at), item['sl']
+        else:
+            outcome, exit_at, exit_price = 'tp', int(tp_at), item['tp']
+
+        exit_index = start + exit_at
+        result.update(
+            outcome=outcome,
+            entry_time=str(times[start]),
+            exit_time=str(times[exit_index]),
+            exit_price=exit_price,
+            bars=int(exit_at),
+            hours_to_exit=float((times[exit_index] - times[start]) / np.timedelta64(1, 'h')),
+            pnl=int(round((exit_price - item['buy']) * result['position']))
+        )
+        results.append(result)
+    return results
+
+async def run_backtest(signals, ohlc_dir=OHLC_DIR):
+    """সিম্বল অনুযায়ী ভাগ করে প্রসেস পুলে ব্যাকটেস্ট চালানো"""
+    by_symbol = {}
+    for item in signals:
+        by_symbol.setdefault(item['symbol'], []).append(item)
+
+    loop = asyncio.get_running_loop()
+    results = []
+    jobs = []
+    for sym, items in by_symbol.items():
+        path = os.path.join(ohlc_dir, f"{sym}.csv")
+        if os.path.exists(path):
+            jobs.append((sym, items, loop.run_in_executor(get_process_pool(), backtest_symbol, path, items)))
+        else:
+            results.extend({'id': item.get('id'), 'symbol': sym, 'outcome': 'no_data'} for item in items)
+
+    # একটি সিম্বলের ভুল CSV যেন বাকিগুলোকে আটকে না দেয়
+    outcomes = await asyncio.gather(*(job for _, _, job in jobs), return_exceptions=True)
+    for (sym, items, _), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning(f"⚠️ {sym} ব্যাকটেস্ট করা যায়নি: {outcome}")
+            results.extend({'id': item.get('id'), 'symbol': sym, 'outcome': 'error'} for item in items)
+        else:
+            results.extend(outcome)
+    results.sort(key=lambda r: r['id'] or 0)
+    return results
+
+def summarize_backtest(results):
+    """ব্যাকটেস্ট ফলাফলের সারাংশ টেক্সট"""
+    counts = {'tp': 0, 'sl': 0, 'open': 0, 'not_filled': 0, 'no_data': 0, 'error': 0}
+    for r in results:
+        counts[r['outcome']] += 1
+    tested = [r for r in results if r['outcome'] in ('tp', 'sl', 'open')]
+    closed = [r for r in tested if r['outcome'] in ('tp', 'sl')]
+    total_pnl = sum(r['pnl'] for r in tested)
+    win_rate = counts['tp'] / len(closed) * 100 if closed else 0
+    avg_hours = sum(r['hours_to_exit'] for r in closed) / len(closed) if closed else 0
+
+    return f"""🧪 **ব্যাকটেস্ট ফলাফল**
 
-    # মূল মেনুর বাটন
-    keyboard = [
-        [
-            InlineKeyboardButton("📋 লিস্ট দেখুন", callback_data="menu_list"),
-            InlineKeyboardButton("📊 পরিসংখ্যান", callback_data="menu_stats")
-        ],
-        [
-            InlineKeyboardButton("📥 এক্সপোর্ট", callback_data="menu_export"),
-            InlineKeyboardButton("❓ সাহায্য", callback_data="menu_help")
-        ],
-        [
-            InlineKeyboardButton("🗑 সব মুছুন", callback_data="menu_delete_all")
+╔════════════════════════════════╗
+║ মোট সিগন্যাল: {len(results):<18} ║
+║ 🎯 TP হিট: {counts['tp']:<21} ║
+║ 🛑 SL হিট: {counts['sl']:<21} ║
+║ ⏳ এখনো ওপেন: {counts['open']:<18} ║
+║ 🚫 এন্ট্রি হয়নি: {counts['not_filled']:<16} ║
+║ 📭 ডাটা নেই: {counts['no_data']:<19} ║
+║ ❌ ভুল OHLC ফাইল: {counts['error']:<14} ║
+╠════════════════════════════════╣
+║ উইন রেট: {win_rate:>13.1f}%          ║
+║ মোট P/L: {total_pnl:>13,} BDT      ║
+║ গড় এক্সিট সময়: {avg_hours:>9.1f} ঘণ্টা  ║
+╚════════════════════════════════╝"""
+
+def build_backtest_csv(results):
+    """ব্যাকটেস্ট ফলাফল CSV বাইট"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['ID', 'Symbol', 'Outcome', 'Entry Time', 'Exit Time', 'Exit Price', 'Bars', 'Hours To Exit', 'Position', 'P/L'])
+    for r in results:
+        writer.writerow([
+            r['id'], r['symbol'], r['outcome'],
+            r.get('entry_time', ''), r.get('exit_time', ''), r.get('exit_price', ''),
+            r.get('bars', ''), round(r['hours_to_exit'], 2) if 'hours_to_exit' in r else '',
+            r.get('position', ''), r.get('pnl', '')
+        ])
+    csv_data = output.getvalue()
+    output.close()
+    return csv_data.encode()
+
+# ---------------------------------------------------------------------------
+# What-if গ্রিড
+#
+# রিস্ক × ক্যাপিটাল × SL শিফট% × TP শিফট% গ্রিডের প্রতিটি সেলে ইউজারের সব
+# সিগন্যালের মোট পজিশন/প্রফিট/লস NumPy ব্রডকাস্টিং দিয়ে হিসাব হয়। সেলগুলো
+# WHATIF_CHUNK আকারের টুকরোয় হিসাব হয়ে সাথে সাথে CSV তে লেখা হয়, বড় CSV gzip
+# হয়। পুরোটা প্রসেস পুলে চলে বলে বড় গ্রিডেও ইভেন্ট লুপ আটকায় না।
+# ---------------------------------------------------------------------------
+WHATIF_DEFAULTS = {
+    'risk': (0.005, 0.01, 0.015, 0.02),
+    'capital': (100000, 250000, 500000, 1000000),
+    'sl': (0,),
+    'tp': (0,)
+}
+# সিগন্যাল × গ্রিড সেল (হিসাবের খরচ) এবং শুধু গ্রিড সেল (CSV সারি) দুটোরই সীমা
+MAX_WHATIF_CELLS = 200_000_000
+MAX_WHATIF_GRID = 1_000_000
+# ওয়ার্কারে একবারে হিসাব হওয়া (সেল × সিগন্যাল) - মেমরি এর উপর নির্ভর করে, গ্রিডের উপর নয়
+WHATIF_CHUNK = 200_000
+# এর চেয়ে বেশি সারির CSV gzip করে পাঠানো হয়
+WHATIF_GZIP_ROWS = 50_000
+# টেলিগ্রাম মেসেজের 4096 অক্ষরের মধ্যে রাখতে হিটম্যাপে সর্বোচ্চ সারি/কলাম
+HEATMAP_MAX_ROWS = 12
+HEATMAP_MAX_COLS = 6
+HEATMAP_SHADES = ' ░▒▓█'
+
+def parse_whatif_args(args):
+    """'risk=0.01,0.02 capital=100000 sl=-2,0 tp=0,5' -> গ্রিড ডিকশনারি"""
+    grid = dict(WHATIF_DEFAULTS)
+    for arg in args:
+        key, _, values = arg.partition('=')
+        key = key.lower()
+        if key not in grid or not values:
+            raise ValueError(arg)
+        grid[key] = tuple(float(v) for v in values.split(',') if v)
+        if not grid[key] or not all(math.isfinite(v) for v in grid[key]):
+            raise ValueError(arg)
+        # রিস্ক/ক্যাপিটাল ধনাত্মক, শিফট -100% এর বেশি (লেভেল শূন্য বা ঋণাত্মক নয়)
+        lowest = 0 if key in ('risk', 'capital') else -100
+        if min(grid[key]) <= lowest:
+            raise ValueError(arg)
+    return grid
+
+def whatif_grid(buy, sl, tp, risk_amounts, sl_shifts, tp_shifts):
+    """কিছু গ্রিড সেলে সব সিগন্যালের যোগফল - (exposure, profit, loss) অ্যারে
+
+    risk_amounts ও sl_shifts জোড়ায় জোড়ায় K টি সেল; exposure ও loss এর আকার (K,), profit এর (K, tp)।
+    """
+    sl_levels = sl[None, :] * (1 + sl_shifts[:, None] / 100)      # (K, N)
+    diff = buy[None, :] - sl_levels                                # (K, N)
+
+    safe_diff = np.where(diff > 0, diff, 1)
+    position = np.where(
+        diff > 0,
+        np.rint(risk_amounts[:, None] / safe_diff),
+        0
+    )                                                              # (K, N)
+
+    exposure = np.rint(position * buy).sum(axis=-1)                # (K,)
+    loss = (position * diff).sum(axis=-1)                          # (K,)
+    # Σ position × (tp × (1 + শিফট) - buy) = (1 + শিফট) × (position·tp) - position·buy,
+    # তাই (T, N) অ্যারে লাগে না
+    profit = (1 + tp_shifts[None, :] / 100) * (position @ tp)[:, None] - (position @ buy)[:, None]  # (K, T)
+    return exposure, profit, loss
+
+def whatif_report(buy, sl, tp, grid):
+    """গ্রিড হিসাব, হিটম্যাপ ও CSV - পুরোটাই প্রসেস পুলে চলে
+
+    (রিস্ক, ক্যাপিটাল, SL শিফট) সেলগুলো টুকরো করে হিসাব হয় এবং সাথে সাথে CSV তে লেখা হয়।
+    ফেরত দেয় (হিটম্যাপ, CSV বাইট, gzip কিনা)।
+    """
+    risks, capitals, sl_shifts, tp_shifts = (
+        np.array(grid[key], dtype=np.float64) for key in ('risk', 'capital', 'sl', 'tp')
+    )
+    shape = (len(risks), len(capitals), len(sl_shifts))
+    n_cells = shape[0] * shape[1] * shape[2]
+    chunk = max(1, WHATIF_CHUNK // max(len(buy), len(tp_shifts)))
+    sl_i, tp_i = _heatmap_shifts(grid)
+    heat = np.zeros(shape[:2])
+
+    compressed = whatif_cells(grid, 1) > WHATIF_GZIP_ROWS
+    output = io.BytesIO()
+    binary = gzip.GzipFile(fileobj=output, mode='wb', compresslevel=1) if compressed else output
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(['Risk%', 'Capital', 'SL Shift%', 'TP Shift%', 'Exposure', 'Profit', 'Loss', 'RRR'])
+
+    # CSV তে ইউজারের দেওয়া মানই (int/float) লেখা হয়
+    labels = {key: np.array(grid[key], dtype=object) for key in ('capital', 'sl', 'tp')}
+    n_tp = len(tp_shifts)
+    for start in range(0, n_cells, chunk):
+        r, c, s = np.unravel_index(np.arange(start, min(start + chunk, n_cells)), shape)
+        exposure, profit, loss = whatif_grid(buy, sl, tp, risks[r] * capitals[c], sl_shifts[s], tp_shifts)
+        at_shift = s == sl_i
+        heat[r[at_shift], c[at_shift]] = profit[at_shift, tp_i]
+
+        # সারি = (সেল, TP শিফট), TP শিফট সবচেয়ে ভেতরের লুপ
+        loss_rows = np.repeat(loss, n_tp)
+        profit_rows = profit.ravel()
+        rrr = np.round(profit_rows / np.where(loss_rows > 0, loss_rows, 1), 2).astype(object)
+        rrr[loss_rows <= 0] = 0
+        columns = (
+            np.repeat(risks[r] * 100, n_tp),
+            np.repeat(labels['capital'][c], n_tp),
+            np.repeat(labels['sl'][s], n_tp),
+            np.tile(labels['tp'], len(r)),
+            np.repeat(exposure.astype(np.int64), n_tp),
+            np.rint(profit_rows).astype(np.int64),
+            np.rint(loss_rows).astype(np.int64),
+            rrr
+        )
+        # অনেক TP শিফটে একটি সেলেরই অনেক সারি হতে পারে, তাই লেখাও টুকরো করে
+        for row_start in range(0, len(rrr), WHATIF_CHUNK):
+            writer.writerows(zip(*(col[row_start:row_start + WHATIF_CHUNK].tolist() for col in columns)))
+            # প্রতি টুকরো একবারে বাইনারি স্ট্রিমে - পুরো CSV কখনো টেক্সট হিসেবে মেমরিতে থাকে না
+            binary.write(text.getvalue().encode())
+            text.seek(0)
+            text.truncate()
+
+    binary.write(text.getvalue().encode())
+    if compressed:
+        binary.close()
+    return format_whatif_heatmap(grid, heat), output.getvalue(), compressed
+
+async def run_whatif(signals, grid):
+    """প্রসেস পুলে what-if চালানো - (হিটম্যাপ টেক্সট, CSV বাইট, gzip কিনা)"""
+    buy = np.array([item['buy'] for item in signals], dtype=np.float64)
+    sl = np.array([item['sl'] for item in signals], dtype=np.float64)
+    tp = np.array([item['tp'] for item in signals], dtype=np.float64)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), whatif_report, buy, sl, tp, grid)
+
+def whatif_cells(grid, n_signals):
+    cells = n_signals
+    for values in grid.values():
+        cells *= len(values)
+    return cells
+
+def _heatmap_axis(n, limit):
+    """বড় অক্ষ থেকে সমান দূরত্বে সর্বোচ্চ limit টি ইনডেক্স"""
+    if n <= limit:
+        return list(range(n))
+    return sorted({int(round(i)) for i in np.linspace(0, n - 1, limit)})
+
+def _heatmap_shifts(grid):
+    """হিটম্যাপের SL/TP শিফট ইনডেক্স - 0% থাকলে সেটা, না হলে প্রথমটা"""
+    sl_i = grid['sl'].index(0) if 0 in grid['sl'] else 0
+    tp_i = grid['tp'].index(0) if 0 in grid['tp'] else 0
+    return sl_i, tp_i
+
+def format_whatif_heatmap(grid, values):
+    """রিস্ক × ক্যাপিটাল হিটম্যাপ (values = হিটম্যাপের শিফটে মোট প্রফিট, হাজার BDT)"""
+    sl_i, tp_i = _heatmap_shifts(grid)
+    rows = _heatmap_axis(len(grid['risk']), HEATMAP_MAX_ROWS)
+    cols = _heatmap_axis(len(grid['capital']), HEATMAP_MAX_COLS)
+    top = values.max() if values.size and values.max() > 0 else 1
+
+    table = "```\n"
+    table += f"{'Risk':>6} │" + "".join(f"{grid['capital'][c] / 1000:>9,.0f}k" for c in cols) + "\n"
+    table += "─" * 7 + "┼" + "─" * (10 * len(cols)) + "\n"
+    for r in rows:
+        row = f"{grid['risk'][r] * 100:>5.2f}% │"
+        for c in cols:
+            value = values[r, c]
+            shade = HEATMAP_SHADES[int(max(value, 0) / top * (len(HEATMAP_SHADES) - 1))]
+            row += f"{value / 1000:>8,.0f}k{shade}"
+        table += row + "\n"
+    table += "```"
+
+    shown = ""
+    if len(rows) < len(grid['risk']) or len(cols) < len(grid['capital']):
+        shown = f"\n(দেখানো হলো {len(rows)}/{len(grid['risk'])} রিস্ক × {len(cols)}/{len(grid['capital'])} ক্যাপিটাল, পুরোটা CSV তে)"
+
+    return f"""🔮 **What-if: মোট প্রফিট (হাজার BDT)**
+SL শিফট {grid['sl'][sl_i]:+.1f}%, TP শিফট {grid['tp'][tp_i]:+.1f}%
+সারি = রিস্ক, কলাম = ক্যাপিটাল{shown}
+
+{table}"""
+
+# ---------------------------------------------------------------------------
+# পোর্টফোলিও
+#
+# ওপেন সিগন্যালগুলোর মোট এক্সপোজার, সব SL হিট হলে মোট ক্যাপিটাল অ্যাট
+# রিস্ক এবং সিম্বলভিত্তিক এক্সপোজার স্টোর লিসেনার হিসেবে ইনক্রিমেন্টালি
+# রাখা হয় - হিস্ট্রি যত বড়ই হোক উত্তর O(1)।
+# ---------------------------------------------------------------------------
+USER_SETTINGS_FILE = "user_settings.json"
+# ডিফল্ট সীমা (BDT), 0 মানে সীমা নেই - ইউজার /setlimit দিয়ে বদলাতে পারে
+PORTFOLIO_EXPOSURE_CAP = float(os.environ.get('PORTFOLIO_EXPOSURE_CAP', 0))
+PORTFOLIO_RISK_CAP = float(os.environ.get('PORTFOLIO_RISK_CAP', 0))
+
+def load_settings():
+    """ইউজার সেটিংস লোড করা"""
+    if os.path.exists(USER_SETTINGS_FILE):
+        try:
+            with open(USER_SETTINGS_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    return {}
+
+def save_settings(settings):
+    """ইউজার সেটিংস সংরক্ষণ করা"""
+    with open(USER_SETTINGS_FILE, 'w') as f:
+        json.dump(settings, f, separators=(',', ':'))
+
+def user_limits(settings, user_id):
+    """ইউজারের (exposure_cap, risk_cap)"""
+    user = settings.get(user_id, {})
+    return (
+        user.get('capital_limit', PORTFOLIO_EXPOSURE_CAP),
+        user.get('risk_cap', PORTFOLIO_RISK_CAP)
+    )
+
+class PortfolioIndex:
+    """ওপেন সিগন্যালের পোর্টফোলিও টোটাল - স্টোর লিসেনার"""
+
+    def __init__(self):
+        self._users = {}
+
+    def on_add(self, user_id, item):
+        if is_open(item):
+            self._apply(user_id, item, 1)
+
+    def on_remove(self, user_id, item):
+        if is_open(item):
+            self._apply(user_id, item, -1)
+
+    def _apply(self, user_id, item, sign):
+        agg = self._users.setdefault(user_id, {'open_signals': 0, 'exposure': 0, 'capital_at_risk': 0, 'symbols': {}})
+        exposure = calculate_exposure(item)
+        agg['open_signals'] += sign
+        agg['exposure'] += sign * exposure
+        agg['capital_at_risk'] += sign * calculate_profit_loss(item)['loss']
+
+        symbols = agg['symbols']
+        symbols[item['symbol']] = symbols.get(item['symbol'], 0) + sign * exposure
+        if agg['open_signals'] == 0:
+            del self._users[user_id]
+        elif symbols[item['symbol']] == 0:
+            del symbols[item['symbol']]
+
+    def totals(self, user_id):
+        """{'open_signals', 'exposure', 'capital_at_risk', 'symbols'}"""
+        return self._users.get(user_id, {'open_signals': 0, 'exposure': 0, 'capital_at_risk': 0, 'symbols': {}})
+
+    def check(self, user_id, item, exposure_cap, risk_cap):
+        """নতুন সিগন্যাল যোগ করলে কোন সীমা ভাঙবে - সতর্কবার্তার লিস্ট"""
+        totals = self.totals(user_id)
+        warnings = []
+        exposure = totals['exposure'] + calculate_exposure(item)
+        if exposure_cap and exposure > exposure_cap:
+            warnings.append(f"মোট এক্সপোজার {exposure:,} BDT হবে (সীমা {exposure_cap:,.0f} BDT)")
+        at_risk = totals['capital_at_risk'] + calculate_profit_loss(item)['loss']
+        if risk_cap and at_risk > risk_cap:
+            warnings.append(f"মোট ক্যাপিটাল অ্যাট রিস্ক {at_risk:,} BDT হবে (সীমা {risk_cap:,.0f} BDT)")
+        return warnings
+
+def format_portfolio_text(totals, exposure_cap, risk_cap):
+    """পোর্টফোলিও মেসেজ তৈরি করা"""
+    exposure_cap_text = f"{exposure_cap:,.0f} BDT" if exposure_cap else "নেই"
+    risk_cap_text = f"{risk_cap:,.0f} BDT" if risk_cap else "নেই"
+    text = f"""💼 **আপনার পোর্টফোলিও**
+
+╔════════════════════════════════╗
+║ ওপেন সিগন্যাল: {totals['open_signals']:<17} ║
+║ মোট এক্সপোজার: {totals['exposure']:>12,} BDT   ║
+║ ক্যাপিটাল অ্যাট রিস্ক: {totals['capital_at_risk']:>9,} BDT ║
+╠════════════════════════════════╣
+║ এক্সপোজার সীমা: {exposure_cap_text:>15} ║
+║ রিস্ক সীমা: {risk_cap_text:>19} ║
+"""
+    if exposure_cap:
+        text += f"║ হেডরুম: {exposure_cap - totals['exposure']:>15,.0f} BDT   ║\n"
+    text += "╚════════════════════════════════╝\n"
+
+    if totals['symbols'] and totals['exposure']:
+        text += "\n**সিম্বল অনুযায়ী এক্সপোজার:**\n"
+        for sym, exposure in sorted(totals['symbols'].items(), key=lambda kv: kv[1], reverse=True):
+            text += f"• {sym}: {exposure:,} BDT ({exposure / totals['exposure'] * 100:.1f}%)\n"
+    return text
+
+# ---------------------------------------------------------------------------
+# দৈনিক ডাইজেস্ট
+#
+# স্টোরের উপর একবার মাত্র পাস করে প্রতিটি ইউজারের নতুন সিগন্যাল, সেরা RRR
+# সেটআপ ও পোর্টফোলিও টোটাল (PortfolioIndex থেকে O(1)) বের করা হয়। পাঠানো
+# হয় DIGEST_CONCURRENCY সীমার মধ্যে সমান্তরালভাবে।
+# ---------------------------------------------------------------------------
+# কমা দিয়ে আলাদা অ্যাডমিন user_id
+ADMIN_IDS = {uid.strip() for uid in os.environ.get('ADMIN_IDS', '').split(',') if uid.strip()}
+DIGEST_TIME = os.environ.get('DIGEST_TIME', '18:00')
+DIGEST_TIMEZONE = ZoneInfo(os.environ.get('DIGEST_TIMEZONE', 'Asia/Dhaka'))
+DIGEST_CONCURRENCY = int(os.environ.get('DIGEST_CONCURRENCY', 10))
+DIGEST_MAX_RETRIES = 3
+DIGEST_TOP_N = 3
+
+def is_admin(user_id):
+    return str(user_id) in ADMIN_IDS
+
+def format_digest(new_signals, top_signals, totals):
+    """একজন ইউজারের ডাইজেস্ট টেক্সট"""
+    text = f"🗓 **দৈনিক ডাইজেস্ট**\n\n🆕 গত ২৪ ঘণ্টায় নতুন সিগন্যাল: {len(new_signals)} টি\n"
+    for item in new_signals[:10]:
+        text += f"• #{item['id']} {item['symbol']} (RRR {calculate_rrr(item):.1f})\n"
+
+    if top_signals:
+        text += "\n🏆 **সেরা RRR সেটআপ:**\n"
+        for rrr, _, item in top_signals:
+            text += f"• #{item['id']} {item['symbol']}: RRR {rrr:.1f}, বাই {item['buy']:.1f}, SL {item['sl']:.1f}, TP {item['tp']:.1f}\n"
+
+    text += (
+        f"\n💼 ওপেন সিগন্যাল: {totals['open_signals']}"
+        f"\n💵 মোট এক্সপোজার: {totals['exposure']:,} BDT"
+        f"\n⚠️ ক্যাপিটাল অ্যাট রিস্ক: {totals['capital_at_risk']:,} BDT"
+    )
+    return text
+
+def build_digests(signal_store, portfolio_index, since):
+    """স্টোরের উপর এক পাসে সব ইউজারের ডাইজেস্ট - [(user_id, text)]"""
+    since_iso = since.isoformat()
+    digests = []
+    for user_id, signals in signal_store.users():
+        new_signals = []
+        top = []
+        for item in signals.values():
+            # ISO টাইমস্ট্যাম্প স্ট্রিং তুলনাতেই সাজানো থাকে
+            if (item.get('timestamp') or '') >= since_iso:
+                new_signals.append(item)
+            if is_open(item):
+                entry = (calculate_rrr(item), item['id'], item)
+                if len(top) < DIGEST_TOP_N:
+                    heapq.heappush(top, entry)
+                elif entry[:2] > top[0][:2]:
+                    heapq.heapreplace(top, entry)
+
+        totals = portfolio_index.totals(user_id)
+        if not new_signals and not totals['open_signals']:
+            continue
+        top.sort(key=lambda entry: entry[:2], reverse=True)
+        digests.append((user_id, format_digest(new_signals, top, totals)))
+    return digests
+
+async def send_digests(bot, digests, concurrency=DIGEST_CONCURRENCY):
+    """সীমিত সমান্তরালতায় ডাইজেস্ট পাঠানো - সফলভাবে পাঠানো সংখ্যা"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(user_id, text):
+        async with semaphore:
+            for attempt in range(DIGEST_MAX_RETRIES + 1):
+                try:
+                    await bot.send_message(chat_id=user_id, text=text, parse_mode='Markdown')
+                    return True
+                except RetryAfter as e:
+                    # টেলিগ্রামের ফ্লাড লিমিট - বলা সময় অপেক্ষা করে আবার চেষ্টা
+                    if attempt == DIGEST_MAX_RETRIES:
+                        logger.warning(f"⚠️ ডাইজেস্ট পাঠানো যায়নি ({user_id}): বারবার ফ্লাড লিমিট")
+                        return False
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    logger.warning(f"⚠️ ডাইজেস্ট পাঠানো যায়নি ({user_id}): {e}")
+                    return False
+
+    results = await asyncio.gather(*(send(user_id, text) for user_id, text in digests))
+    return sum(results)
+
+def run_digest_pass():
+    """ডাইজেস্ট পাস চালানো - (digests, সময় সেকেন্ডে)"""
+    started = time.perf_counter()
+    digests = build_digests(store, portfolio, datetime.now() - timedelta(days=1))
+    return digests, time.perf_counter() - started
+
+async def daily_digest_job(context: ContextTypes.DEFAULT_TYPE):
+    """JobQueue থেকে প্রতিদিন চলা ডাইজেস্ট"""
+    digests, elapsed = run_digest_pass()
+    sent = await send_digests(context.bot, digests)
+    logger.info(f"🗓 ডাইজেস্ট: {sent}/{len(digests)} পাঠানো হয়েছে (পাস {elapsed:.3f}s)")
+
+# ---------------------------------------------------------------------------
+# সিম্বল ইনভার্টেড ইনডেক্স (অ্যাডমিন অ্যানালিটিক্স)
+#
+# symbol -> {(user_id, signal_id)} পোস্টিং এবং প্রতি সিম্বলের ইউজার সংখ্যা,
+# মোট ওপেন এক্সপোজার ও RRR যোগফল প্রতিটি রাইটে আপডেট হয়। তাই অ্যাডমিন
+# প্রশ্নের উত্তর মোট সিগন্যাল সংখ্যা নয়, শুধু সিম্বল সংখ্যার উপর নির্ভর করে।
+# ---------------------------------------------------------------------------
+SYMBOL_USERS_SHOWN = 10
+
+class SymbolIndex:
+    """ক্রস-ইউজার সিম্বল ইনডেক্স - স্টোর লিসেনার"""
+
+    def __init__(self):
+        self._postings = {}
+        self._symbols = {}
+        # (user_id, signal_id) -> (symbol, exposure, rrr) - রিমুভের জন্য হালকা এন্ট্রি
+        self._refs = {}
+        # user_id -> {signal_id} - delete_user শুধু সেই ইউজারের সিগন্যাল ছোঁয়
+        self._user_refs = {}
+
+    def on_add(self, user_id, item):
+        ref = (user_id, item['id'])
+        if ref in self._refs:
+            self._remove_ref(ref)
+        exposure = calculate_exposure(item) if is_open(item) else 0
+        entry = (item['symbol'], exposure, calculate_rrr(item))
+        self._refs[ref] = entry
+        self._user_refs.setdefault(user_id, set()).add(item['id'])
+
+        sym = entry[0]
+        self._postings.setdefault(sym, set()).add(ref)
+        agg = self._symbols.setdefault(sym, {'users': {}, 'signals': 0, 'exposure': 0, 'sum_rrr': 0})
+        agg['users'][user_id] = agg['users'].get(user_id, 0) + 1
+        agg['signals'] += 1
+        agg['exposure'] += exposure
+        agg['sum_rrr'] += entry[2]
+
+    def on_remove(self, user_id, item):
+        self._remove_ref((user_id, item['id']))
+
+    def _remove_ref(self, ref):
+        entry = self._refs.pop(ref, None)
+        if entry is None:
+            return
+        sym, exposure, rrr = entry
+        user_id, signal_id = ref
+        user_refs = self._user_refs[user_id]
+        user_refs.discard(signal_id)
+        if not user_refs:
+            del self._user_refs[user_id]
+        postings = self._postings[sym]
+        postings.discard(ref)
+        agg = self._symbols[sym]
+        agg['users'][user_id] -= 1
+        if agg['users'][user_id] == 0:
+            del agg['users'][user_id]
+        agg['signals'] -= 1
+        agg['exposure'] -= exposure
+        agg['sum_rrr'] -= rrr
+        if not postings:
+            del self._postings[sym]
+            del self._symbols[sym]
+
+    def remove_signal(self, user_id, signal_id):
+        self._remove_ref((user_id, signal_id))
+
+    def remove_user(self, user_id):
+        """ইউজারের সব সিগন্যাল বাদ - শুধু তার সিগন্যাল সংখ্যার সমানুপাতিক"""
+        for signal_id in list(self._user_refs.get(user_id, ())):
+            self._remove_ref((user_id, signal_id))
+
+    def replay_journal(self, journal_path):
+        """স্টোরের জার্নাল (অসমাপ্ত চেকপয়েন্টের .1 সহ) ইনডেক্সে প্রয়োগ করা"""
+        replay_journal(journal_path, self.on_add, self.remove_signal, self.remove_user)
+
+    def signals_for(self, symbol):
+        """সিম্বলের সব (user_id, signal_id)"""
+        return self._postings.get(symbol, set())
+
+    def users_for(self, symbol, n=SYMBOL_USERS_SHOWN):
+        """সিগন্যাল সংখ্যা অনুযায়ী শীর্ষ n ইউজার - [(user_id, [signal_id, ...])]"""
+        by_user = {}
+        for user_id, signal_id in self.signals_for(symbol):
+            by_user.setdefault(user_id, []).append(signal_id)
+        top = heapq.nlargest(n, by_user.items(), key=lambda kv: len(kv[1]))
+        return [(user_id, sorted(ids)) for user_id, ids in top]
+
+    def symbol_summary(self, symbol):
+        """একটি সিম্বলের সারাংশ, না থাকলে None"""
+        agg = self._symbols.get(symbol)
+        if agg is None:
+            return None
+        return {
+            'symbol': symbol,
+            'users': len(agg['users']),
+            'signals': agg['signals'],
+            'exposure': agg['exposure'],
+            'avg_rrr': agg['sum_rrr'] / agg['signals']
+        }
+
+    def symbol_count(self):
+        return len(self._symbols)
+
+    def signal_count(self):
+        return len(self._refs)
+
+    def top_by_exposure(self, n=20):
+        """মোট ওপেন এক্সপোজার অনুযায়ী শীর্ষ n সিম্বল"""
+        top = heapq.nlargest(n, self._symbols.items(), key=lambda kv: kv[1]['exposure'])
+        return [self.symbol_summary(sym) for sym, _ in top]
+
+    def top_by_avg_rrr(self, n=20):
+        """গড় RRR অনুযায়ী শীর্ষ n সিম্বল"""
+        top = heapq.nlargest(n, self._symbols.items(), key=lambda kv: kv[1]['sum_rrr'] / kv[1]['signals'])
+        return [self.symbol_summary(sym) for sym, _ in top]
+
+class _JsonStream:
+    """ফাইল থেকে অল্প অল্প করে পড়ে JSON টোকেন ডিকোড করা"""
+
+    def __init__(self, f, chunk_size):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._pos > self._chunk_size:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+        self._buf += chunk
+
+    def peek(self):
+        """পরের নন-হোয়াইটস্পেস অক্ষর (ফাইল শেষে '')"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf) or self._eof:
+                return self._buf[self._pos:self._pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"'{char}' আশা করা হয়েছিল, পাওয়া গেছে '{self.peek()}'")
+        self._pos += 1
+
+    def decode(self):
+        """পরের পূর্ণ JSON মান (দরকার হলে আরো পড়ে)"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                self._pos = end
+                return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+
+def iter_data_file(path, chunk_size=1 << 16):
+    """{user_id: [signal, ...]} JSON ফাইল পুরোটা লোড না করে (user_id, item) স্ট্রিম"""
+    with open(path, 'r') as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            user_id = stream.decode()
+            stream.expect(':')
+            if user_id == NEXT_IDS_KEY:
+                # সিগন্যাল নয়, id হাই-ওয়াটার মার্ক
+                stream.decode()
+            else:
+                stream.expect('[')
+                while stream.peek() != ']':
+                    yield user_id, stream.decode()
+                    if stream.peek() != ',':
+                        break
+                    stream.expect(',')
+                stream.expect(']')
+            if stream.peek() == ',':
+                stream.expect(',')
+                continue
+            stream.expect('}')
+            return
+
+def iter_stored_signals():
+    """ডাটা ফাইল থেকে (user_id, item) স্ট্রিম - একবারে একজন ইউজারের বেশি নয়"""
+    if DATA_FORMAT == 'binary':
+        if os.path.exists(SNAPSHOT_FILE):
+            with SignalSnapshot(SNAPSHOT_FILE) as snap:
+                for user_id, signals in snap.iter_users():
+                    for item in signals:
+                        yield user_id, item
+        return
+    if os.path.exists(DATA_FILE):
+        yield from iter_data_file(DATA_FILE)
+
+def load_user_signals(user_id):
+    """একজন ইউজারের বর্তমান সিগন্যাল - পুরো স্টোর লোড না করে (রিড-অনলি CLI টুলের জন্য)
+
+    বাইনারি ফরম্যাটে স্ন্যাপশটের ইনডেক্স থেকে শুধু এই ইউজারের অংশ mmap করে পড়া হয়,
+    তারপর জার্নালের শুধু এই ইউজারের এন্ট্রি প্রয়োগ হয়।
+    """
+    if DATA_FORMAT == 'binary':
+        signals = []
+        if os.path.exists(SNAPSHOT_FILE):
+            with SignalSnapshot(SNAPSHOT_FILE) as snap:
+                signals = snap.user_signals(user_id)
+    else:
+        signals = [item for uid, item in iter_stored_signals() if uid == user_id]
+
+    user_store = SignalStore()
+    for item in signals:
+        user_store._put(user_id, item)
+    for entry in iter_journal(JOURNAL_FILE):
+        if entry.get('user') == user_id:
+            user_store._apply(entry)
+    return user_store.user_signals(user_id)
+
+def rebuild_symbol_index():
+    """ডাটা ফাইল স্ট্রিম করে ও জার্নাল রিপ্লে করে নতুন SymbolIndex তৈরি
+
+    শুধু ডায়াগনস্টিক CLI টুল - চলমান বটের symbol_index স্টোর লোডের সময় লিসেনার হিসেবে তৈরি হয়।
+    """
+    index = SymbolIndex()
+    next_ids = {}
+    for user_id, item in iter_stored_signals():
+        # id-বিহীন পুরনো সিগন্যালে SignalStore.load() এর মতো একই id
+        assign_signal_id(next_ids, user_id, item)
+        index.on_add(user_id, item)
+    index.replay_journal(JOURNAL_FILE)
+    return index
+
+def format_symbol_table(title, summaries):
+    """সিম্বল সারাংশের টেবিল"""
+    if not summaries:
+        return "📭 কোন ডাটা নেই।"
+    table = "```\n"
+    table += f"{'#':<3} {'Symbol':<8} {'Users':>6} {'Signals':>8} {'Exposure':>14} {'AvgRRR':>7}\n"
+    table += "=" * 52 + "\n"
+    for i, summary in enumerate(summaries, 1):
+        table += f"{i:<3} {summary['symbol']:<8} {summary['users']:>6,} {summary['signals']:>8,} {summary['exposure']:>14,} {summary['avg_rrr']:>7.2f}\n"
+    table += "```"
+    return f"{title}\n\n{table}"
+
+# গ্লোবাল স্টোর ও তার উপর নির্ভরশীল ইনডেক্স
+store = SignalStore()
+user_stats = UserStatsIndex()
+store.subscribe(user_stats)
+price_monitor = PriceMonitor()
+store.subscribe(price_monitor)
+portfolio = PortfolioIndex()
+store.subscribe(portfolio)
+symbol_index = SymbolIndex()
+store.subscribe(symbol_index)
+user_settings = {}
+
+def format_stats_text(stats):
+    """পরিসংখ্যান মেসেজ তৈরি করা"""
+    text = f"""📊 **আপনার পরিসংখ্যান**
+
+╔════════════════════════════════╗
+║ মোট সিগন্যাল: {stats['total_signals']:<18} ║
+║ মোট ক্যাপিটাল: {stats['total_capital']:>12,.0f} BDT   ║
+║ মোট রিস্ক: {stats['total_risk']:>12,.0f} BDT      ║
+║ গড় RRR: {stats['avg_rrr']:>14.2f}            ║
+║ গড় প্রফিট%: {stats['avg_profit_percent']:>11.2f}%         ║
+╚════════════════════════════════╝
+
+**সিম্বল অনুযায়ী:**
+"""
+
+    for sym, data in stats['symbols'].items():
+        avg_profit = data['total_profit_percent'] / data['count']
+        text += f"• {sym}: {data['count']} টি (টোটাল {data['total_capital']:,.0f} BDT, গড় প্রফিট {avg_profit:.1f}%)\n"
+
+    return text
+
+def build_signals_csv(data_list, include_timestamp=True):
+    """সিগন্যাল লিস্ট থেকে CSV বাইট তৈরি করা"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    header = ['Symbol', 'Capital', 'Risk%', 'Buy', 'SL', 'TP', 'RRR', 'Diff', 'Profit%', 'Loss%', 'Position', 'Exposure', 'Risk Amount', 'Profit Amount', 'Loss Amount']
+    if include_timestamp:
+        header.append('Timestamp')
+    writer.writerow(header)
+
+    for item in data_list:
+        pl = calculate_profit_loss(item)
+        row = [
+            item['symbol'],
+            item['capital'],
+            item['risk']*100,
+            item['buy'],
+            item['sl'],
+            item['tp'],
+            calculate_rrr(item),
+            calculate_diff(item),
+            calculate_profit_percentage(item),
+            calculate_loss_percentage(item),
+            calculate_position(item),
+            calculate_exposure(item),
+            calculate_risk_amount(item),
+            pl['profit'],
+            pl['loss']
         ]
+        if include_timestamp:
+            row.append((item.get('timestamp') or '')[:10])
+        writer.writerow(row)
+
+    csv_data = output.getvalue()
+    output.close()
+    return csv_data.encode()
+
+# ---------------------------------------------------------------------------
+# স্ট্যাটিক মেনু ও হেল্প টেক্সট - একবারই তৈরি হয়, প্রতি ক্লিকে নয়
+# ---------------------------------------------------------------------------
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📋 লিস্ট দেখুন", callback_data="menu_list"),
+        InlineKeyboardButton("📊 পরিসংখ্যান", callback_data="menu_stats")
+    ],
+    [
+        InlineKeyboardButton("📥 এক্সপোর্ট", callback_data="menu_export"),
+        InlineKeyboardButton("❓ সাহায্য", callback_data="menu_help")
+    ],
+    [
+        InlineKeyboardButton("💼 পোর্টফোলিও", callback_data="menu_portfolio"),
+        InlineKeyboardButton("🗑 সব মুছুন", callback_data="menu_delete_all")
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+])
+
+HELP_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📋 ফরম্যাট", callback_data="help_format"),
+        InlineKeyboardButton("📊 ক্যালকুলেশন", callback_data="help_calc")
+    ],
+    [
+        InlineKeyboardButton("🎯 কমান্ড", callback_data="help_commands"),
+        InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")
+    ]
+])
+
+EXPORT_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📥 CSV ফাইল", callback_data="export_csv"),
+    ],
+    [InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")]
+])
+
+DELETE_CONFIRM_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("✅ হ্যাঁ, মুছুন", callback_data="confirm_delete"),
+        InlineKeyboardButton("❌ না, বাতিল", callback_data="back_to_main")
+    ]
+])
+
+def signal_action_buttons(signal_id):
+    """একটি সিগন্যালের এডিট/ক্লোজ/ডিলিট বাটন সারি"""
+    return [
+        InlineKeyboardButton("✏️ এডিট", callback_data=f"sig_edit:{signal_id}"),
+        InlineKeyboardButton("✅ ক্লোজ", callback_data=f"sig_close:{signal_id}"),
+        InlineKeyboardButton("🗑 মুছুন", callback_data=f"sig_delete:{signal_id}")
+    ]
+
+BACK_TO_MAIN_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")]])
+
+HELP_TEXT = """📝 **সাহায্য ও নির্দেশিকা**
+
+নিচের বিষয়গুলো সম্পর্কে জানতে বাটনে ক্লিক করুন:"""
+
+HELP_FORMAT_TEXT = """📋 **ফরম্যাট ব্যাখ্যা**
+
+`aaa 500000 0.01 30 29 39`
+
+• **aaa** - স্টক সিম্বল (যেকোনো নাম)
+• **500000** - মূলধন (টাকায়)
+• **0.01** - রিস্ক পার্সেন্টেজ (1%)
+• **30** - বাই প্রাইস
+• **29** - স্টপ লস (SL)
+• **39** - টার্গেট প্রাইস (TP)
+
+**আউটপুটে দেখাবে:**
+• প্রফিট/লস অ্যামাউন্ট (টাকায়)
+• প্রফিট/লস পার্সেন্টেজ
+• RRR, ডিফ, পজিশন, এক্সপোজার"""
+
+HELP_CALC_TEXT = """📊 **ক্যালকুলেশন ফর্মুলা**
+
+• **RRR** = (TP - Buy) / (Buy - SL)
+• **পজিশন** = (ক্যাপিটাল × রিস্ক) / (Buy - SL)
+• **এক্সপোজার** = পজিশন × Buy
+• **রিস্ক অ্যামাউন্ট** = ক্যাপিটাল × রিস্ক
+• **প্রফিট অ্যামাউন্ট** = (TP - Buy) × পজিশন
+• **লস অ্যামাউন্ট** = (Buy - SL) × পজিশন
+• **প্রফিট%** = ((TP - Buy) / Buy) × 100
+• **লস%** = ((Buy - SL) / Buy) × 100"""
+
+HELP_COMMANDS_TEXT = """🎯 **কমান্ড লিস্ট**
+
+/start - বট শুরু করুন
+/help - সাহায্য দেখুন
+/list - কম্প্যাক্ট ভিউ দেখুন
+/listall - বিস্তারিত ভিউ দেখুন
+/stats - পরিসংখ্যান দেখুন
+/portfolio - পোর্টফোলিও এক্সপোজার দেখুন
+/setlimit - এক্সপোজার ও রিস্ক সীমা সেট করুন
+/export - ডাটা এক্সপোর্ট করুন
+/edit <id> - একটি সিগন্যাল এডিট করুন
+/close <id> - একটি সিগন্যাল ক্লোজ করুন
+/remove <id> - একটি সিগন্যাল মুছুন
+/backtest - OHLC ডাটায় ব্যাকটেস্ট করুন
+/whatif - রিস্ক/ক্যাপিটাল সিনারিও গ্রিড দেখুন
+/delete - সব ডাটা মুছুন"""
+
+ADD_MORE_TEXT = "➕ নতুন সিগন্যাল পাঠান:\n\nফরম্যাট: `সিম্বল ক্যাপিটাল রিস্ক বাই এসএল টিপি`\nযেমন: `aaa 500000 0.01 30 29 39`"
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/start কমান্ড হ্যান্ডলার"""
+    user = update.effective_user
 
     text = f"""হ্যালো {user.first_name}! 👋
 
@@ -315,27 +2172,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 নিচের বাটন ব্যবহার করুন:"""
 
-    await update.message.reply_text(text, reply_markup=reply_markup)
+    await update.message.reply_text(text, reply_markup=MAIN_MENU_MARKUP)
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/help কমান্ড হ্যান্ডলার"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📋 ফরম্যাট", callback_data="help_format"),
-            InlineKeyboardButton("📊 ক্যালকুলেশন", callback_data="help_calc")
-        ],
-        [
-            InlineKeyboardButton("🎯 কমান্ড", callback_data="help_commands"),
-            InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    text = """📝 **সাহায্য ও নির্দেশিকা**
-
-নিচের বিষয়গুলো সম্পর্কে জানতে বাটনে ক্লিক করুন:"""
-
-    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    await update.message.reply_text(HELP_TEXT, parse_mode='Markdown', reply_markup=HELP_MENU_MARKUP)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ইনকামিং মেসেজ হ্যান্ডলার"""
@@ -345,25 +2186,28 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data_item = parse_data_format(text)
 
     if data_item:
-        all_data = load_data()
-
-        if user_id not in all_data:
-            all_data[user_id] = []
+        # যোগ করার আগেই পোর্টফোলিও সীমা যাচাই
+        warnings = portfolio.check(user_id, data_item, *user_limits(user_settings, user_id))
+        data_item = store.add(user_id, data_item)
 
-        all_data[user_id].append(data_item)
-        save_data(all_data)
-
-        signal_box = format_signal(data_item)
+        signal_box = format_signal(data_item, data_item['id'])
 
         # অ্যাকশন বাটন
-        keyboard = [[
-            InlineKeyboardButton("📋 সব লিস্ট", callback_data="menu_list"),
-            InlineKeyboardButton("➕ আরো যোগ", callback_data="add_more")
-        ]]
+        keyboard = [
+            [
+                InlineKeyboardButton("📋 সব লিস্ট", callback_data="menu_list"),
+                InlineKeyboardButton("➕ আরো যোগ", callback_data="add_more")
+            ],
+            signal_action_buttons(data_item['id'])
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
+        text = f"✅ **সিগন্যাল সংরক্ষিত!**\n{signal_box}"
+        if warnings:
+            text += "\n⚠️ **পোর্টফোলিও সীমা ছাড়িয়ে যাচ্ছে:**\n" + "\n".join(f"• {w}" for w in warnings)
+
         await update.message.reply_text(
-            f"✅ **সিগন্যাল সংরক্ষিত!**\n{signal_box}",
+            text,
             parse_mode='Markdown',
             reply_markup=reply_markup
         )
@@ -381,14 +2225,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def list_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """কম্প্যাক্ট টেবিল ভিউ"""
     user_id = str(update.effective_user.id)
-    all_data = load_data()
+    signals = store.user_signals(user_id)
 
-    if user_id not in all_data or not all_data[user_id]:
+    if not signals:
         await update.message.reply_text('📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।')
         return
 
     sorted_data = sorted(
-        all_data[user_id], 
+        signals, 
         key=lambda x: calculate_rrr(x), 
         reverse=True
     )
@@ -416,15 +2260,15 @@ async def list_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def list_all_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """বিস্তারিত টেবিল ভিউ দেখানো"""
     user_id = str(update.effective_user.id)
-    all_data = load_data()
+    signals = store.user_signals(user_id)
 
-    if user_id not in all_data or not all_data[user_id]:
+    if not signals:
         await update.message.reply_text('📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।')
         return
 
     # RRR অনুযায়ী সাজানো
     sorted_data = sorted(
-        all_data[user_id], 
+        signals, 
         key=lambda x: calculate_rrr(x), 
         reverse=True
     )
@@ -444,82 +2288,28 @@ async def list_all_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """পরিসংখ্যান দেখানো"""
     user_id = str(update.effective_user.id)
-    all_data = load_data()
+    stats = user_stats.stats(user_id)
 
-    if user_id not in all_data or not all_data[user_id]:
+    if stats is None:
         await update.message.reply_text('📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।')
         return
 
-    stats = get_statistics(all_data[user_id])
-
-    text = f"""📊 **আপনার পরিসংখ্যান**
-
-╔════════════════════════════════╗
-║ মোট সিগন্যাল: {stats['total_signals']:<18} ║
-║ মোট ক্যাপিটাল: {stats['total_capital']:>12,.0f} BDT   ║
-║ মোট রিস্ক: {stats['total_risk']:>12,.0f} BDT      ║
-║ গড় RRR: {stats['avg_rrr']:>14.2f}            ║
-║ গড় প্রফিট%: {stats['avg_profit_percent']:>11.2f}%         ║
-╚════════════════════════════════╝
-
-**সিম্বল অনুযায়ী:**
-"""
-
-    for sym, data in stats['symbols'].items():
-        avg_profit = data['total_profit_percent'] / data['count']
-        text += f"• {sym}: {data['count']} টি (টোটাল {data['total_capital']:,.0f} BDT, গড় প্রফিট {avg_profit:.1f}%)\n"
+    text = format_stats_text(stats)
 
-    keyboard = [[
-        InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")
-    ]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await update.message.reply_text(text, reply_markup=reply_markup)
+    await update.message.reply_text(text, reply_markup=BACK_TO_MAIN_MARKUP)
 
 async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ডাটা CSV ফরম্যাটে এক্সপোর্ট"""
     user_id = str(update.effective_user.id)
-    all_data = load_data()
+    signals = store.user_signals(user_id)
 
-    if user_id not in all_data or not all_data[user_id]:
+    if not signals:
         await update.message.reply_text('📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।')
         return
 
-    # CSV ফাইল তৈরি
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # হেডার
-    writer.writerow(['Symbol', 'Capital', 'Risk%', 'Buy', 'SL', 'TP', 'RRR', 'Diff', 'Profit%', 'Loss%', 'Position', 'Exposure', 'Risk Amount', 'Profit Amount', 'Loss Amount', 'Timestamp'])
-
-    # ডাটা
-    for item in all_data[user_id]:
-        pl = calculate_profit_loss(item)
-        writer.writerow([
-            item['symbol'],
-            item['capital'],
-            item['risk']*100,
-            item['buy'],
-            item['sl'],
-            item['tp'],
-            calculate_rrr(item),
-            calculate_diff(item),
-            calculate_profit_percentage(item),
-            calculate_loss_percentage(item),
-            calculate_position(item),
-            calculate_exposure(item),
-            calculate_risk_amount(item),
-            pl['profit'],
-            pl['loss'],
-            item['timestamp'][:10]
-        ])
-
-    csv_data = output.getvalue()
-    output.close()
-
     # ফাইল হিসেবে পাঠানো
     await update.message.reply_document(
-        document=io.BytesIO(csv_data.encode()),
+        document=io.BytesIO(build_signals_csv(signals)),
         filename=f"signals_{datetime.now().strftime('%Y%m%d')}.csv",
         caption="📥 আপনার সিগন্যাল এক্সপোর্ট করা হলো"
     )
@@ -527,288 +2317,450 @@ async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def delete_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """সব ইউজার ডাটা মুছে ফেলা"""
     user_id = str(update.effective_user.id)
-    all_data = load_data()
-
-    if user_id in all_data:
-        del all_data[user_id]
-        save_data(all_data)
+    if store.delete_user(user_id):
         await update.message.reply_text("✅ সব ডাটা মুছে ফেলা হয়েছে।")
     else:
         await update.message.reply_text('📭 আপনার মুছে ফেলার মতো কোনো ডাটা নেই।')
 
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """বাটন ক্লিক হ্যান্ডলার"""
-    query = update.callback_query
-    await query.answer()
+def parse_signal_id(value):
+    """টেক্সট থেকে সিগন্যাল id, ভুল হলে None"""
+    try:
+        signal_id = int(value)
+    except (TypeError, ValueError):
+        return None
+    return signal_id if signal_id > 0 else None
 
-    user_id = str(query.from_user.id)
-    all_data = load_data()
+def edit_signal(user_id, signal_id, text):
+    """ফরম্যাট লাইন দিয়ে একটি সিগন্যাল এডিট - নতুন আইটেম অথবা None"""
+    data_item = parse_data_format(text)
+    if data_item is None:
+        return None
+    # মূল টাইমস্ট্যাম্প রেখে শুধু মানগুলো বদলানো
+    data_item.pop('timestamp')
+    return store.update(user_id, signal_id, **data_item)
 
-    # মেনু হ্যান্ডলিং
-    if query.data == "back_to_main":
-        keyboard = [
-            [
-                InlineKeyboardButton("📋 লিস্ট দেখুন", callback_data="menu_list"),
-                InlineKeyboardButton("📊 পরিসংখ্যান", callback_data="menu_stats")
-            ],
-            [
-                InlineKeyboardButton("📥 এক্সপোর্ট", callback_data="menu_export"),
-                InlineKeyboardButton("❓ সাহায্য", callback_data="menu_help")
-            ],
-            [
-                InlineKeyboardButton("🗑 সব মুছুন", callback_data="menu_delete_all")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+async def edit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/edit <id> <ফরম্যাট> - একটি সিগন্যাল এডিট"""
+    user_id = str(update.effective_user.id)
+    args = context.args or []
+    signal_id = parse_signal_id(args[0]) if args else None
 
-        await query.edit_message_text(
-            "🔙 **মূল মেনুতে ফিরে আসুন**\n\nনিচের বাটন ব্যবহার করুন:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+    if signal_id is None or len(args) < 2:
+        await update.message.reply_text(
+            "ব্যবহার: `/edit <id> aaa 500000 0.01 30 29 39`",
+            parse_mode='Markdown'
         )
         return
 
-    elif query.data == "menu_list":
-        if user_id not in all_data or not all_data[user_id]:
-            await query.edit_message_text("📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।")
-            return
+    if store.get(user_id, signal_id) is None:
+        await update.message.reply_text(f"❌ #{signal_id} সিগন্যাল পাওয়া যায়নি।")
+        return
 
-        sorted_data = sorted(
-            all_data[user_id], 
-            key=lambda x: calculate_rrr(x), 
-            reverse=True
+    item = edit_signal(user_id, signal_id, ' '.join(args[1:]))
+    if item is None:
+        await update.message.reply_text(
+            "❌ **ভুল ফরম্যাট!**\n\nসঠিক ফরম্যাট:\n`aaa 500000 0.01 30 29 39`",
+            parse_mode='Markdown'
         )
+        return
 
-        table = create_compact_table(sorted_data)
+    await update.message.reply_text(
+        f"✏️ **সিগন্যাল আপডেট হয়েছে!**\n{format_signal(item, signal_id)}",
+        parse_mode='Markdown',
+        reply_markup=InlineKeyboardMarkup([signal_action_buttons(signal_id)])
+    )
 
-        keyboard = [
-            [
-                InlineKeyboardButton("📊 বিস্তারিত", callback_data="show_detailed"),
-                InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+async def close_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/close <id> - একটি সিগন্যাল ক্লোজ"""
+    user_id = str(update.effective_user.id)
+    signal_id = parse_signal_id(context.args[0]) if context.args else None
 
-        await query.edit_message_text(
-            f"📋 **কম্প্যাক্ট ভিউ:**\n\n{table}",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+    if signal_id is None:
+        await update.message.reply_text("ব্যবহার: `/close <id>`", parse_mode='Markdown')
         return
 
-    elif query.data == "menu_stats":
-        if user_id not in all_data or not all_data[user_id]:
-            await query.edit_message_text("📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।")
-            return
-
-        stats = get_statistics(all_data[user_id])
+    result = store.close(user_id, signal_id)
+    await update.message.reply_text(close_result_text(store, user_id, signal_id, result))
 
-        text = f"""📊 **আপনার পরিসংখ্যান**
+async def remove_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/remove <id> - একটি সিগন্যাল মুছে ফেলা"""
+    user_id = str(update.effective_user.id)
+    signal_id = parse_signal_id(context.args[0]) if context.args else None
 
-╔════════════════════════════════╗
-║ মোট সিগন্যাল: {stats['total_signals']:<18} ║
-║ মোট ক্যাপিটাল: {stats['total_capital']:>12,.0f} BDT   ║
-║ মোট রিস্ক: {stats['total_risk']:>12,.0f} BDT      ║
-║ গড় RRR: {stats['avg_rrr']:>14.2f}            ║
-║ গড় প্রফিট%: {stats['avg_profit_percent']:>11.2f}%         ║
-╚════════════════════════════════╝
+    if signal_id is None:
+        await update.message.reply_text("ব্যবহার: `/remove <id>`", parse_mode='Markdown')
+        return
 
-**সিম্বল অনুযায়ী:**\n"""
+    if store.delete(user_id, signal_id) is None:
+        await update.message.reply_text(f"❌ #{signal_id} সিগন্যাল পাওয়া যায়নি।")
+        return
 
-        for sym, data in stats['symbols'].items():
-            avg_profit = data['total_profit_percent'] / data['count']
-            text += f"• {sym}: {data['count']} টি (টোটাল {data['total_capital']:,.0f} BDT, গড় প্রফিট {avg_profit:.1f}%)\n"
+    await update.message.reply_text(f"🗑 #{signal_id} সিগন্যাল মুছে ফেলা হয়েছে।")
 
-        keyboard = [[InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+async def backtest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/backtest - সংরক্ষিত সিগন্যাল OHLC ডাটার উপর ব্যাকটেস্ট"""
+    user_id = str(update.effective_user.id)
+    signals = store.user_signals(user_id)
 
-        await query.edit_message_text(text, reply_markup=reply_markup)
+    if not signals:
+        await update.message.reply_text('📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।')
         return
 
-    elif query.data == "menu_export":
-        # এক্সপোর্ট অপশন
-        keyboard = [
-            [
-                InlineKeyboardButton("📥 CSV ফাইল", callback_data="export_csv"),
-            ],
-            [InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text("🧪 ব্যাকটেস্ট চলছে... এক মুহূর্ত অপেক্ষা করুন।")
 
-        await query.edit_message_text(
-            "📥 **এক্সপোর্ট ফরম্যাট নির্বাচন করুন:**",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+    started = time.perf_counter()
+    results = await run_backtest(signals)
+    elapsed = time.perf_counter() - started
+
+    await update.message.reply_text(
+        f"{summarize_backtest(results)}\n\n⏱ {elapsed:.2f} সেকেন্ড",
+        parse_mode='Markdown'
+    )
+    await update.message.reply_document(
+        document=io.BytesIO(build_backtest_csv(results)),
+        filename=f"backtest_{datetime.now().strftime('%Y%m%d')}.csv",
+        caption="🧪 ব্যাকটেস্টের বিস্তারিত ফলাফল"
+    )
+
+async def whatif_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/whatif risk=.. capital=.. sl=.. tp=.. - পজিশন সাইজিং সিনারিও গ্রিড"""
+    user_id = str(update.effective_user.id)
+    signals = store.user_signals(user_id)
+
+    if not signals:
+        await update.message.reply_text('📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।')
+        return
+
+    try:
+        grid = parse_whatif_args(context.args or [])
+    except ValueError:
+        await update.message.reply_text(
+            "ব্যবহার: `/whatif risk=0.005,0.01,0.02 capital=100000,500000 sl=-2,0,2 tp=0,5`\n"
+            "(sl/tp = লেভেল কত % সরানো হবে)",
+            parse_mode='Markdown'
         )
         return
 
-    elif query.data == "export_csv":
-        await query.edit_message_text("📥 CSV ফাইল তৈরি হচ্ছে... এক মুহূর্ত অপেক্ষা করুন।")
-
-        if user_id in all_data and all_data[user_id]:
-            output = io.StringIO()
-            writer = csv.writer(output)
-
-            writer.writerow(['Symbol', 'Capital', 'Risk%', 'Buy', 'SL', 'TP', 'RRR', 'Diff', 'Profit%', 'Loss%', 'Position', 'Exposure', 'Risk Amount', 'Profit Amount', 'Loss Amount'])
-
-            for item in all_data[user_id]:
-                pl = calculate_profit_loss(item)
-                writer.writerow([
-                    item['symbol'],
-                    item['capital'],
-                    item['risk']*100,
-                    item['buy'],
-                    item['sl'],
-                    item['tp'],
-                    calculate_rrr(item),
-                    calculate_diff(item),
-                    calculate_profit_percentage(item),
-                    calculate_loss_percentage(item),
-                    calculate_position(item),
-                    calculate_exposure(item),
-                    calculate_risk_amount(item),
-                    pl['profit'],
-                    pl['loss']
-                ])
-
-            csv_data = output.getvalue()
-            output.close()
-
-            await context.bot.send_document(
-                chat_id=user_id,
-                document=io.BytesIO(csv_data.encode()),
-                filename=f"signals_{datetime.now().strftime('%Y%m%d')}.csv",
-                caption="📥 আপনার সিগন্যাল এক্সপোর্ট করা হলো"
-            )
+    grid_cells = whatif_cells(grid, 1)
+    if grid_cells > MAX_WHATIF_GRID:
+        await update.message.reply_text(f"❌ গ্রিড অনেক বড় ({grid_cells:,} সেল, সীমা {MAX_WHATIF_GRID:,})।")
         return
 
-    elif query.data == "menu_help":
-        keyboard = [
-            [
-                InlineKeyboardButton("📋 ফরম্যাট", callback_data="help_format"),
-                InlineKeyboardButton("📊 ক্যালকুলেশন", callback_data="help_calc")
-            ],
-            [
-                InlineKeyboardButton("🎯 কমান্ড", callback_data="help_commands"),
-                InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    cells = whatif_cells(grid, len(signals))
+    if cells > MAX_WHATIF_CELLS:
+        await update.message.reply_text(
+            f"❌ গ্রিড × সিগন্যাল অনেক বড় ({cells:,}, সীমা {MAX_WHATIF_CELLS:,})। গ্রিড ছোট করুন।"
+        )
+        return
 
-        await query.edit_message_text(
-            "📝 **সাহায্য ও নির্দেশিকা**\n\nনিচের বিষয়গুলো সম্পর্কে জানতে বাটনে ক্লিক করুন:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+    heatmap, csv_bytes, compressed = await run_whatif(signals, grid)
+
+    await update.message.reply_text(heatmap, parse_mode='Markdown')
+    await update.message.reply_document(
+        document=io.BytesIO(csv_bytes),
+        filename=f"whatif_{datetime.now().strftime('%Y%m%d')}.csv" + (".gz" if compressed else ""),
+        caption=f"🔮 What-if গ্রিড ({grid_cells:,} সেল, {len(signals)} সিগন্যাল)"
+    )
+
+async def portfolio_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/portfolio - ওপেন এক্সপোজার ও ক্যাপিটাল অ্যাট রিস্ক"""
+    user_id = str(update.effective_user.id)
+    exposure_cap, risk_cap = user_limits(user_settings, user_id)
+    text = format_portfolio_text(portfolio.totals(user_id), exposure_cap, risk_cap)
+    await update.message.reply_text(text, reply_markup=BACK_TO_MAIN_MARKUP)
+
+async def setlimit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/setlimit <এক্সপোজার সীমা> [রিস্ক সীমা] - পোর্টফোলিও সীমা সেট"""
+    user_id = str(update.effective_user.id)
+    try:
+        limits = [float(arg) for arg in (context.args or [])]
+    except ValueError:
+        limits = []
+
+    if not 1 <= len(limits) <= 2 or any(limit < 0 for limit in limits):
+        await update.message.reply_text(
+            "ব্যবহার: `/setlimit 1000000 20000`\n(এক্সপোজার সীমা, ঐচ্ছিক রিস্ক সীমা - 0 মানে সীমা নেই)",
+            parse_mode='Markdown'
         )
         return
 
-    elif query.data == "menu_delete_all":
-        # কনফার্মেশন বাটন
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ হ্যাঁ, মুছুন", callback_data="confirm_delete"),
-                InlineKeyboardButton("❌ না, বাতিল", callback_data="back_to_main")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    user = user_settings.setdefault(user_id, {})
+    user['capital_limit'] = limits[0]
+    if len(limits) == 2:
+        user['risk_cap'] = limits[1]
+    save_settings(user_settings)
 
-        await query.edit_message_text(
-            "⚠️ **আপনি কি নিশ্চিত?**\n\nআপনার সব ডাটা চিরতরে মুছে যাবে!",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
+    exposure_cap, risk_cap = user_limits(user_settings, user_id)
+    await update.message.reply_text(format_portfolio_text(portfolio.totals(user_id), exposure_cap, risk_cap))
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/digest [dryrun] - অ্যাডমিনের জন্য ডাইজেস্ট এখনই চালানো"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ এই কমান্ড শুধু অ্যাডমিনদের জন্য।")
+        return
+
+    digests, elapsed = run_digest_pass()
+    if context.args and context.args[0].lower() == 'dryrun':
+        await update.message.reply_text(
+            f"🧪 ডাইজেস্ট ড্রাই-রান\n\n⏱ পাস: {elapsed:.3f} সেকেন্ড\n✉️ পাঠানো হতো: {len(digests)} টি মেসেজ"
         )
         return
 
-    elif query.data == "confirm_delete":
-        if user_id in all_data:
-            del all_data[user_id]
-            save_data(all_data)
-            await query.edit_message_text("✅ সব ডাটা মুছে ফেলা হয়েছে।")
+    sent = await send_digests(context.bot, digests)
+    await update.message.reply_text(f"🗓 ডাইজেস্ট পাঠানো হয়েছে: {sent}/{len(digests)} (পাস {elapsed:.3f} সেকেন্ড)")
+
+def parse_top_n(args, default=20):
+    try:
+        return max(1, min(int(args[0]), 100)) if args else default
+    except ValueError:
+        return default
+
+async def symbol_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/symbol <SYMBOL> - অ্যাডমিন: একটি সিম্বলে কতজন ইউজার ও কারা"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ এই কমান্ড শুধু অ্যাডমিনদের জন্য।")
+        return
+    if not context.args:
+        await update.message.reply_text("ব্যবহার: `/symbol AAA`", parse_mode='Markdown')
         return
 
-    elif query.data == "show_detailed":
-        if user_id not in all_data or not all_data[user_id]:
-            await query.edit_message_text("📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।")
-            return
+    summary = symbol_index.symbol_summary(context.args[0].upper())
+    if summary is None:
+        await update.message.reply_text(f"📭 {context.args[0].upper()} সিম্বলে কোনো সিগন্যাল নেই।")
+        return
 
-        sorted_data = sorted(
-            all_data[user_id], 
-            key=lambda x: calculate_rrr(x), 
-            reverse=True
-        )
+    users = symbol_index.users_for(summary['symbol'])
+    user_lines = "\n".join(
+        f"• `{user_id}`: " + ", ".join(f"#{signal_id}" for signal_id in ids[:SYMBOL_USERS_SHOWN])
+        + (f" ... (+{len(ids) - SYMBOL_USERS_SHOWN})" if len(ids) > SYMBOL_USERS_SHOWN else "")
+        for user_id, ids in users
+    )
+    if summary['users'] > len(users):
+        user_lines += f"\n... আরো {summary['users'] - len(users):,} জন"
 
-        table = create_table_view(sorted_data)
+    await update.message.reply_text(
+        f"""🔎 **{summary['symbol']}**
 
-        keyboard = [[InlineKeyboardButton("🔙 কম্প্যাক্ট ভিউ", callback_data="menu_list")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+👥 ইউজার: {summary['users']:,}
+📊 সিগন্যাল: {summary['signals']:,}
+💵 মোট ওপেন এক্সপোজার: {summary['exposure']:,} BDT
+📈 গড় RRR: {summary['avg_rrr']:.2f}
 
-        await query.edit_message_text(
-            f"📊 **বিস্তারিত ভিউ:**\n\n{table}",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+👤 সবচেয়ে বেশি সিগন্যাল যাদের:
+{user_lines}""",
+        parse_mode='Markdown'
+    )
+
+async def topsymbols_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/topsymbols [n] - অ্যাডমিন: এক্সপোজার অনুযায়ী শীর্ষ সিম্বল"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ এই কমান্ড শুধু অ্যাডমিনদের জন্য।")
         return
+    n = parse_top_n(context.args)
+    await update.message.reply_text(
+        format_symbol_table(f"🏦 **এক্সপোজার অনুযায়ী শীর্ষ {n} সিম্বল**", symbol_index.top_by_exposure(n)),
+        parse_mode='Markdown'
+    )
 
-    elif query.data == "add_more":
-        await query.edit_message_text(
-            "➕ নতুন সিগন্যাল পাঠান:\n\nফরম্যাট: `সিম্বল ক্যাপিটাল রিস্ক বাই এসএল টিপি`\nযেমন: `aaa 500000 0.01 30 29 39`",
-            parse_mode='Markdown'
-        )
+async def symbolrrr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/symbolrrr [n] - অ্যাডমিন: গড় RRR অনুযায়ী সিম্বল"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ এই কমান্ড শুধু অ্যাডমিনদের জন্য।")
         return
+    n = parse_top_n(context.args)
+    await update.message.reply_text(
+        format_symbol_table(f"📈 **গড় RRR অনুযায়ী শীর্ষ {n} সিম্বল**", symbol_index.top_by_avg_rrr(n)),
+        parse_mode='Markdown'
+    )
 
-    # হেল্প সাব-মেনু
-    elif query.data == "help_format":
-        await query.edit_message_text(
-            """📋 **ফরম্যাট ব্যাখ্যা**
+# ---------------------------------------------------------------------------
+# কলব্যাক রাউটার
+#
+# প্রতিটি রাউট জানিয়ে দেয় তার কোন ডাটা লাগবে:
+#   NEEDS_NONE   - কোনো ডাটা লোড নয় (মেনু, হেল্প)
+#   NEEDS_USER   - শুধু এই ইউজারের সিগন্যাল
+#   NEEDS_MUTATE - পুরো স্টোর, হ্যান্ডলার id দিয়ে পরিবর্তন করবে
+#
+# callback_data ফরম্যাট: "route" অথবা "route:arg1:arg2" (পেজিনেশন,
+# নির্দিষ্ট সিগন্যালের অ্যাকশনের জন্য)।
+# ---------------------------------------------------------------------------
+NEEDS_NONE = 'none'
+NEEDS_USER = 'user'
+NEEDS_MUTATE = 'mutate'
+
+CALLBACK_ROUTES = {}
+
+def callback_route(name, needs=NEEDS_NONE):
+    """কলব্যাক রাউট রেজিস্টার করার ডেকোরেটর"""
+    def decorator(func):
+        CALLBACK_ROUTES[name] = (func, needs)
+        return func
+    return decorator
+
+def static_route(name, text, reply_markup=None):
+    """প্রি-বিল্ট টেক্সট ও মেনু দেখানোর রাউট"""
+    async def handler(query, context, user_id, data, args):
+        await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    CALLBACK_ROUTES[name] = (handler, NEEDS_NONE)
+
+def parse_callback_data(callback_data):
+    """'route:arg1:arg2' কে (route, [arg1, arg2]) এ ভাগ করা"""
+    name, _, rest = (callback_data or '').partition(':')
+    return name, rest.split(':') if rest else []
+
+static_route("back_to_main", "🔙 **মূল মেনুতে ফিরে আসুন**\n\nনিচের বাটন ব্যবহার করুন:", MAIN_MENU_MARKUP)
+static_route("menu_help", HELP_TEXT, HELP_MENU_MARKUP)
+static_route("menu_export", "📥 **এক্সপোর্ট ফরম্যাট নির্বাচন করুন:**", EXPORT_MENU_MARKUP)
+static_route("menu_delete_all", "⚠️ **আপনি কি নিশ্চিত?**\n\nআপনার সব ডাটা চিরতরে মুছে যাবে!", DELETE_CONFIRM_MARKUP)
+static_route("add_more", ADD_MORE_TEXT)
+static_route("help_format", HELP_FORMAT_TEXT)
+static_route("help_calc", HELP_CALC_TEXT)
+static_route("help_commands", HELP_COMMANDS_TEXT)
+
+@callback_route("menu_list", needs=NEEDS_USER)
+async def cb_menu_list(query, context, user_id, signals, args):
+    """কম্প্যাক্ট ভিউ"""
+    if not signals:
+        await query.edit_message_text("📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।")
+        return
 
-`aaa 500000 0.01 30 29 39`
+    sorted_data = sorted(
+        signals, 
+        key=lambda x: calculate_rrr(x), 
+        reverse=True
+    )
 
-• **aaa** - স্টক সিম্বল (যেকোনো নাম)
-• **500000** - মূলধন (টাকায়)
-• **0.01** - রিস্ক পার্সেন্টেজ (1%)
-• **30** - বাই প্রাইস
-• **29** - স্টপ লস (SL)
-• **39** - টার্গেট প্রাইস (TP)
+    table = create_compact_table(sorted_data)
 
-**আউটপুটে দেখাবে:**
-• প্রফিট/লস অ্যামাউন্ট (টাকায়)
-• প্রফিট/লস পার্সেন্টেজ
-• RRR, ডিফ, পজিশন, এক্সপোজার""",
-            parse_mode='Markdown'
-        )
+    keyboard = [
+        [
+            InlineKeyboardButton("📊 বিস্তারিত", callback_data="show_detailed"),
+            InlineKeyboardButton("🔙 মূল মেনু", callback_data="back_to_main")
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.edit_message_text(
+        f"📋 **কম্প্যাক্ট ভিউ:**\n\n{table}",
+        parse_mode='Markdown',
+        reply_markup=reply_markup
+    )
+
+@callback_route("show_detailed", needs=NEEDS_USER)
+async def cb_show_detailed(query, context, user_id, signals, args):
+    """বিস্তারিত ভিউ"""
+    if not signals:
+        await query.edit_message_text("📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।")
         return
 
-    elif query.data == "help_calc":
-        await query.edit_message_text(
-            """📊 **ক্যালকুলেশন ফর্মুলা**
+    sorted_data = sorted(
+        signals, 
+        key=lambda x: calculate_rrr(x), 
+        reverse=True
+    )
 
-• **RRR** = (TP - Buy) / (Buy - SL)
-• **পজিশন** = (ক্যাপিটাল × রিস্ক) / (Buy - SL)
-• **এক্সপোজার** = পজিশন × Buy
-• **রিস্ক অ্যামাউন্ট** = ক্যাপিটাল × রিস্ক
-• **প্রফিট অ্যামাউন্ট** = (TP - Buy) × পজিশন
-• **লস অ্যামাউন্ট** = (Buy - SL) × পজিশন
-• **প্রফিট%** = ((TP - Buy) / Buy) × 100
-• **লস%** = ((Buy - SL) / Buy) × 100""",
-            parse_mode='Markdown'
+    table = create_table_view(sorted_data)
+
+    keyboard = [[InlineKeyboardButton("🔙 কম্প্যাক্ট ভিউ", callback_data="menu_list")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.edit_message_text(
+        f"📊 **বিস্তারিত ভিউ:**\n\n{table}",
+        parse_mode='Markdown',
+        reply_markup=reply_markup
+    )
+
+@callback_route("menu_stats")
+async def cb_menu_stats(query, context, user_id, data, args):
+    """পরিসংখ্যান"""
+    stats = user_stats.stats(user_id)
+    if stats is None:
+        await query.edit_message_text("📭 আপনার কোনো সংরক্ষিত সিগন্যাল নেই।")
+        return
+
+    text = format_stats_text(stats)
+    await query.edit_message_text(text, reply_markup=BACK_TO_MAIN_MARKUP)
+
+@callback_route("menu_portfolio")
+async def cb_menu_portfolio(query, context, user_id, data, args):
+    """পোর্টফোলিও"""
+    exposure_cap, risk_cap = user_limits(user_settings, user_id)
+    text = format_portfolio_text(portfolio.totals(user_id), exposure_cap, risk_cap)
+    await query.edit_message_text(text, reply_markup=BACK_TO_MAIN_MARKUP)
+
+@callback_route("export_csv", needs=NEEDS_USER)
+async def cb_export_csv(query, context, user_id, signals, args):
+    """CSV এক্সপোর্ট"""
+    await query.edit_message_text("📥 CSV ফাইল তৈরি হচ্ছে... এক মুহূর্ত অপেক্ষা করুন।")
+
+    if signals:
+        await context.bot.send_document(
+            chat_id=user_id,
+            document=io.BytesIO(build_signals_csv(signals, include_timestamp=False)),
+            filename=f"signals_{datetime.now().strftime('%Y%m%d')}.csv",
+            caption="📥 আপনার সিগন্যাল এক্সপোর্ট করা হলো"
         )
+
+@callback_route("confirm_delete", needs=NEEDS_MUTATE)
+async def cb_confirm_delete(query, context, user_id, signal_store, args):
+    """সব ডাটা মুছে ফেলা"""
+    if signal_store.delete_user(user_id):
+        await query.edit_message_text("✅ সব ডাটা মুছে ফেলা হয়েছে।")
+
+@callback_route("sig_edit")
+async def cb_sig_edit(query, context, user_id, data, args):
+    """এডিট করার নির্দেশনা দেখানো"""
+    signal_id = parse_signal_id(args[0]) if args else None
+    if signal_id is None:
         return
+    await query.edit_message_text(
+        f"✏️ #{signal_id} এডিট করতে পাঠান:\n\n`/edit {signal_id} aaa 500000 0.01 30 29 39`",
+        parse_mode='Markdown'
+    )
 
-    elif query.data == "help_commands":
-        await query.edit_message_text(
-            """🎯 **কমান্ড লিস্ট**
+@callback_route("sig_close", needs=NEEDS_MUTATE)
+async def cb_sig_close(query, context, user_id, signal_store, args):
+    """একটি সিগন্যাল ক্লোজ"""
+    signal_id = parse_signal_id(args[0]) if args else None
+    if signal_id is None:
+        await query.edit_message_text("❌ সিগন্যাল পাওয়া যায়নি।")
+        return
+    result = signal_store.close(user_id, signal_id)
+    await query.edit_message_text(close_result_text(signal_store, user_id, signal_id, result))
+
+@callback_route("sig_delete", needs=NEEDS_MUTATE)
+async def cb_sig_delete(query, context, user_id, signal_store, args):
+    """একটি সিগন্যাল মুছে ফেলা"""
+    signal_id = parse_signal_id(args[0]) if args else None
+    if signal_id is None or signal_store.delete(user_id, signal_id) is None:
+        await query.edit_message_text("❌ সিগন্যাল পাওয়া যায়নি।")
+        return
+    await query.edit_message_text(f"🗑 #{signal_id} সিগন্যাল মুছে ফেলা হয়েছে।")
 
-/start - বট শুরু করুন
-/help - সাহায্য দেখুন
-/list - কম্প্যাক্ট ভিউ দেখুন
-/listall - বিস্তারিত ভিউ দেখুন
-/stats - পরিসংখ্যান দেখুন
-/export - ডাটা এক্সপোর্ট করুন
-/delete - সব ডাটা মুছুন""",
-            parse_mode='Markdown'
-        )
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """বাটন ক্লিক হ্যান্ডলার - রাউট টেবিল থেকে ডিসপ্যাচ"""
+    query = update.callback_query
+    await query.answer()
+
+    name, args = parse_callback_data(query.data)
+    route = CALLBACK_ROUTES.get(name)
+    if route is None:
+        logger.warning(f"⚠️ অজানা কলব্যাক: {query.data}")
         return
 
+    handler, needs = route
+    user_id = str(query.from_user.id)
+
+    # রাউট যতটুকু ডাটা চায় ঠিক ততটুকুই লোড করা
+    if needs == NEEDS_USER:
+        data = store.user_signals(user_id)
+    elif needs == NEEDS_MUTATE:
+        data = store
+    else:
+        data = None
+
+    await handler(query, context, user_id, data, args)
+
 async def post_init(application: Application):
     """বট চালু হওয়ার পর কমান্ড সেট করা"""
     commands = [
@@ -817,7 +2769,14 @@ async def post_init(application: Application):
         BotCommand("list", "কম্প্যাক্ট ভিউ দেখুন"),
         BotCommand("listall", "বিস্তারিত ভিউ দেখুন"),
         BotCommand("stats", "পরিসংখ্যান দেখুন"),
+        BotCommand("portfolio", "পোর্টফোলিও এক্সপোজার দেখুন"),
+        BotCommand("setlimit", "এক্সপোজার ও রিস্ক সীমা সেট করুন"),
         BotCommand("export", "ডাটা এক্সপোর্ট করুন"),
+        BotCommand("edit", "একটি সিগন্যাল এডিট করুন"),
+        BotCommand("close", "একটি সিগন্যাল ক্লোজ করুন"),
+        BotCommand("remove", "একটি সিগন্যাল মুছুন"),
+        BotCommand("backtest", "OHLC ডাটায় ব্যাকটেস্ট করুন"),
+        BotCommand("whatif", "রিস্ক/ক্যাপিটাল সিনারিও গ্রিড দেখুন"),
         BotCommand("delete", "সব ডাটা মুছুন")
     ]
     await application.bot.set_my_commands(commands)
@@ -825,6 +2784,7 @@ async def post_init(application: Application):
 async def main():
     """মেইন ফাংশন"""
     logger.info("🤖 বট চালু হচ্ছে...")
+    monitor_task = None
 
     try:
         # Flask সার্ভার আলাদা থ্রেডে চালু করুন
@@ -832,6 +2792,10 @@ async def main():
         flask_thread.start()
         logger.info("🌐 HTTP সার্ভার থ্রেড চালু হয়েছে")
 
+        # সিগন্যাল স্টোর লোড করা
+        store.load()
+        user_settings.update(load_settings())
+
         # অ্যাপ্লিকেশন তৈরি
         application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
 
@@ -841,9 +2805,27 @@ async def main():
         application.add_handler(CommandHandler("list", list_data))
         application.add_handler(CommandHandler("listall", list_all_data))
         application.add_handler(CommandHandler("stats", stats_command))
+        application.add_handler(CommandHandler("portfolio", portfolio_command))
+        application.add_handler(CommandHandler("setlimit", setlimit_command))
         application.add_handler(CommandHandler("export", export_data))
+        application.add_handler(CommandHandler("edit", edit_command))
+        application.add_handler(CommandHandler("close", close_command))
+        application.add_handler(CommandHandler("remove", remove_command))
+        application.add_handler(CommandHandler("backtest", backtest_command))
+        application.add_handler(CommandHandler("whatif", whatif_command))
+        application.add_handler(CommandHandler("digest", digest_command))
+        application.add_handler(CommandHandler("symbol", symbol_command))
+        application.add_handler(CommandHandler("topsymbols", topsymbols_command))
+        application.add_handler(CommandHandler("symbolrrr", symbolrrr_command))
         application.add_handler(CommandHandler("delete", delete_all))
 
+        # দৈনিক ডাইজেস্ট শিডিউল
+        if application.job_queue is not None:
+            digest_time = datetime.strptime(DIGEST_TIME, '%H:%M').time().replace(tzinfo=DIGEST_TIMEZONE)
+            application.job_queue.run_daily(daily_digest_job, time=digest_time, name="daily_digest")
+        else:
+            logger.warning("⚠️ JobQueue নেই - দৈনিক ডাইজেস্ট বন্ধ (python-telegram-bot[job-queue] ইনস্টল করুন)")
+
         # মেসেজ হ্যান্ডলার
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
@@ -857,6 +2839,15 @@ async def main():
         await application.start()
         await application.updater.start_polling()
 
+        # প্রাইস ফিড থাকলে SL/TP মনিটর চালু করা
+        if PRICE_FEED:
+            try:
+                source = make_tick_source(PRICE_FEED)
+            except ValueError as e:
+                logger.error(f"❌ PRICE_FEED ভুল, প্রাইস মনিটর বন্ধ: {e}")
+            else:
+                monitor_task = asyncio.create_task(run_price_monitor(application.bot, source))
+
         # বট চালু রাখা
         while True:
             await asyncio.sleep(1)
@@ -866,9 +2857,56 @@ async def main():
 
     finally:
         logger.info("🛑 বট বন্ধ হচ্ছে...")
+        if monitor_task is not None:
+            monitor_task.cancel()
+        store.compact()
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+
+def run_cli(args):
+    """কমান্ড লাইন টুল - কোনো টুল চালালে True"""
+    if args[:1] == ['to-binary']:
+        src = args[1] if len(args) > 1 else DATA_FILE
+        dst = args[2] if len(args) > 2 else SNAPSHOT_FILE
+        data = json_to_snapshot(src, dst)
+        print(f"✅ {src} -> {dst} ({len(data)} ইউজার)")
+        return True
+    if args[:1] == ['to-json']:
+        src = args[1] if len(args) > 1 else SNAPSHOT_FILE
+        dst = args[2] if len(args) > 2 else DATA_FILE
+        data = snapshot_to_json(src, dst)
+        print(f"✅ {src} -> {dst} ({len(data)} ইউজার)")
+        return True
+    if args[:1] == ['digest-dry-run']:
+        store.load(readonly=True)
+        digests, elapsed = run_digest_pass()
+        print(f"🗓 পাস: {elapsed:.3f}s, পাঠানো হতো: {len(digests)} টি মেসেজ")
+        return True
+    if args[:1] == ['user-signals'] and len(args) > 1:
+        signals = load_user_signals(args[1])
+        print(f"👤 {args[1]}: {len(signals)} সিগন্যাল")
+        print(create_compact_table(signals).replace('```', ''))
+        return True
+    if args[:1] == ['rebuild-symbol-index']:
+        started = time.perf_counter()
+        index = rebuild_symbol_index()
+        elapsed = time.perf_counter() - started
+        print(f"🔎 {index.signal_count():,} সিগন্যাল, {index.symbol_count():,} সিম্বল ({elapsed:.2f}s)")
+        print(format_symbol_table("🏦 এক্সপোজার অনুযায়ী শীর্ষ ২০ সিম্বল", index.top_by_exposure(20)).replace('```', ''))
+        return True
+    if args[:1] == ['bench-monitor']:
+        n_signals = int(args[1]) if len(args) > 1 else 100_000
+        n_ticks = int(args[2]) if len(args) > 2 else 10_000
+        result = benchmark_price_monitor(n_signals, n_ticks)
+        print(f"📡 {result['signals']:,} সিগন্যাল ইনডেক্স: {result['index_seconds']:.2f}s")
+        print(f"📡 {result['ticks']:,} টিক: {result['tick_seconds']:.3f}s "
+              f"({result['ticks_per_second']:,.0f} টিক/সেকেন্ড, {result['hits']:,} হিট)")
+        return True
+    return False
 
 if __name__ == '__main__':
-    try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        logger.info("🛑 ইউজার বট বন্ধ করেছেন।")
\ No newline at end of file
+    if not run_cli(sys.argv[1:]):
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            logger.info("🛑 ইউজার বট বন্ধ করেছেন।")
\ No newline at end of file